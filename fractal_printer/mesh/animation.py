@@ -0,0 +1,302 @@
+# Animation sequences: meshes or CPU renders of settings swept over a range
+# (a 4D slice walk, a coefficient morph, a turntable).
+#
+# Consecutive frames of a slow sweep have nearly the same surface, so each
+# mesh frame is sampled warm: only the bricks around the previous frame's
+# surface are evaluated densely, every other brick keeps its previous
+# inside/outside (escaped or not) label, and the band grows wherever a
+# sampled brick disagrees with a neighbour's label. Brick centres are still
+# checked every frame, so surfaces appearing away from the old band are found.
+import copy
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+import meshio
+from skimage.measure import marching_cubes
+
+from fractal_printer.mesh.mesh_generation import _report, box_bounds, grid_step
+from fractal_printer.mesh.mesh_repair import clean_mesh
+
+
+@dataclass
+class BandState:
+    """What one frame leaves for the next: which bricks the surface crossed
+    and which of the rest were inside (both (bricks,) * 3 bool arrays), and
+    where the surface cut each grid edge (sorted edge keys, fraction along
+    the edge)."""
+    band: np.ndarray
+    inside: np.ndarray
+    edges: np.ndarray = None
+    crossings: np.ndarray = None
+
+
+def sweep(settings, key, start, stop, frames):
+    """Copies of `settings` with one value swept linearly over `frames` frames.
+
+    key is a settings key ("slice", "offset", ...) or a (key, index, ...)
+    path into it, e.g. ("coefficients", 1, 2) for the y part of C1."""
+    path = (key,) if isinstance(key, str) else tuple(key)
+    sequence = []
+    for value in np.linspace(start, stop, frames):
+        frame = copy.deepcopy(settings)
+        target = frame
+        for part in path[:-1]:
+            target = target[part]
+        target[path[-1]] = float(value)
+        sequence.append(frame)
+    return sequence
+
+
+# How far past last frame's crossing to probe, in edge lengths
+WARM_BRACKET = 1 / 32
+
+
+# Brick-grid offsets of the six face neighbours, matching _face_signs
+_FACES = np.array([(-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0), (0, 0, -1), (0, 0, 1)])
+
+
+def _face_signs(values):
+    # Whether each face layer of each brick (m, b, b, b) has any inside /
+    # any outside voxel, as (m, 6) arrays in _FACES order
+    faces = [values[:, 0], values[:, -1], values[:, :, 0], values[:, :, -1], values[:, :, :, 0], values[:, :, :, -1]]
+    has_in = np.stack([(f < 0).any(axis=(1, 2)) for f in faces], axis=1)
+    has_out = np.stack([(f >= 0).any(axis=(1, 2)) for f in faces], axis=1)
+    return has_in, has_out
+
+
+def _neighbourhood(mask):
+    # mask dilated by one brick in all 26 directions
+    out = mask.copy()
+    padded = np.pad(mask, 1)
+    n0, n1, n2 = mask.shape
+    for di in range(3):
+        for dj in range(3):
+            for dk in range(3):
+                out |= padded[di:di + n0, dj:dj + n1, dk:dk + n2]
+    return out
+
+
+def sample_band(sdf, samples=2**22, bounds=box_bounds(), brick_size=8, previous=None, slab_points=2**20,
+                progress=None):
+    """Sample `sdf` on the sample_grid grid, densely only in the bricks that
+    can hold surface. Returns (values, origin, step, state, n_sampled); bricks
+    not sampled hold +-(brick radius) according to their inside label.
+
+    With `previous` (the last frame's BandState) the band starts from the old
+    one instead of from every brick whose centre is near the surface."""
+    (x0, y0, z0), (x1, y1, z1) = bounds
+    step = grid_step(bounds, samples)
+    origin = np.array([x0, y0, z0], dtype=float)
+    shape = tuple(len(np.arange(a, b, step)) for a, b in zip(bounds[0], bounds[1]))
+    b = brick_size
+    bricks = tuple(-(-n // b) for n in shape)
+    radius = np.sqrt(3) * (b - 1) / 2 * step
+
+    index = np.indices(bricks).reshape(3, -1).T
+    centres = origin + (index * b + (b - 1) / 2) * step
+    centre_values = np.asarray(sdf(centres)).reshape(bricks)
+    near = np.abs(centre_values) <= radius + step
+
+    if previous is None:
+        inside = centre_values < 0
+        todo = near.copy()
+    else:
+        inside = previous.inside.copy()
+        # The old band, bricks whose centre changed sides, and bricks away
+        # from the old band that the surface may have reached since, inside
+        # ones too (a hole can open in a brick whose centre stays inside).
+        # Movement next to the band is picked up by the face checks below.
+        todo = previous.band | ((centre_values < 0) != inside) | (near & ~_neighbourhood(previous.band))
+
+    values = np.empty((bricks[0] * b, bricks[1] * b, bricks[2] * b), dtype=np.float32)
+    sampled = np.zeros(bricks, dtype=bool)
+    band = np.zeros(bricks, dtype=bool)
+    local = np.indices((b, b, b)).reshape(3, -1).T * step
+    per_call = max(1, slab_points // len(local))
+
+    while todo.any():
+        batch_bricks = np.argwhere(todo)
+        _report(progress, "sampling", sampled.sum() / max(sampled.sum() + len(batch_bricks), 1))
+        has_in = np.empty((len(batch_bricks), 6), dtype=bool)
+        has_out = np.empty((len(batch_bricks), 6), dtype=bool)
+        for start in range(0, len(batch_bricks), per_call):
+            chunk = batch_bricks[start:start + per_call]
+            p = (origin + chunk[:, None, :] * b * step + local[None]).reshape(-1, 3)
+            v = np.asarray(sdf(p), dtype=np.float32).reshape(len(chunk), b, b, b)
+            for (i, j, k), brick in zip(chunk, v):
+                values[i * b:(i + 1) * b, j * b:(j + 1) * b, k * b:(k + 1) * b] = brick
+            has_in[start:start + len(chunk)], has_out[start:start + len(chunk)] = _face_signs(v)
+            all_in = (v < 0).all(axis=(1, 2, 3))
+            all_out = (v >= 0).all(axis=(1, 2, 3))
+            i, j, k = chunk.T
+            band[i, j, k] = ~all_in & ~all_out
+            inside[i, j, k] = all_in
+        sampled |= todo
+
+        # A face voxel on the other side of the unsampled neighbour's label
+        # means the surface runs into that neighbour: sample it too
+        todo = np.zeros(bricks, dtype=bool)
+        for f, offset in enumerate(_FACES):
+            n = batch_bricks + offset
+            valid = np.all((n >= 0) & (n < bricks), axis=1)
+            n, f_in, f_out = n[valid], has_in[valid, f], has_out[valid, f]
+            i, j, k = n.T
+            todo[i[f_in], j[f_in], k[f_in]] |= ~inside[i[f_in], j[f_in], k[f_in]]
+            todo[i[f_out], j[f_out], k[f_out]] |= inside[i[f_out], j[f_out], k[f_out]]
+        todo &= ~sampled
+
+    # Unsampled bricks get a value of the right sign for marching cubes
+    fill = np.where(np.repeat(np.repeat(np.repeat(inside, b, 0), b, 1), b, 2), -radius, radius)
+    unsampled = ~np.repeat(np.repeat(np.repeat(sampled, b, 0), b, 1), b, 2)
+    values[unsampled] = fill[unsampled]
+    _report(progress, "sampling", 1.0)
+
+    values = values[:shape[0], :shape[1], :shape[2]]
+    return values, origin, step, BandState(band, inside), int(sampled.sum())
+
+
+def _edge_values(sdf, lower, axis, t, origin, step):
+    # SDF at fraction t along each grid edge (lower corner index, axis)
+    p = lower.astype(float)
+    p[np.arange(len(p)), axis] += t
+    return np.asarray(sdf(origin + p * step)).reshape(-1)
+
+
+def _edge_inside(sdf, lower, axis, t, origin, step):
+    return _edge_values(sdf, lower, axis, t, origin, step) < 0
+
+
+def bisect_on_grid(sdf, verts, values, origin, step, previous=None, tol=1e-8, bracket_tol=1e-3,
+                   recursion_levels=30, progress=None):
+    """Bisect marching-cubes vertices (in grid index coordinates) along their
+    grid edges, like _bisect_edges, but taking the edge end signs from the
+    sampled `values` instead of two more SDF calls. With `previous` state,
+    each edge the last frame also crossed is first probed at and just beyond
+    the old crossing. Returns (points, edge keys, fractions)."""
+    n = len(verts)
+    rows = np.arange(n)
+    # As in _bisect_edges: the interpolated coordinate is the one furthest
+    # from the grid, the other two are grid indices
+    rounded = np.round(verts)
+    off_grid = np.abs(verts - rounded)
+    axis = np.argmax(off_grid, axis=1)
+    # Lewiner marching cubes adds some vertices inside cells, not on an edge
+    on_edge = np.sort(off_grid, axis=1)[:, 1] < 1e-6
+    lower = rounded.astype(np.int64)
+    lower[rows, axis] = np.floor(verts[rows, axis])
+    t = verts[rows, axis] - lower[rows, axis]
+    lower = np.minimum(lower, np.array(values.shape) - 1)
+    upper = lower.copy()
+    upper[rows, axis] = np.minimum(upper[rows, axis] + 1, np.array(values.shape)[axis] - 1)
+    lower_inside = values[tuple(lower.T)] < 0
+    keys = np.ravel_multi_index(tuple(lower.T), values.shape) * 3 + axis
+
+    # Bracket [a, b] in edge fractions, a on the lower corner's side
+    a = np.zeros(n)
+    b = np.ones(n)
+    crossed = on_edge & (t > 1e-6) & ((values[tuple(upper.T)] < 0) != lower_inside)
+    active = crossed & (recursion_levels > 0)
+    if previous is not None and previous.edges is not None and len(previous.edges):
+        # Probe last frame's crossing, then WARM_BRACKET beyond it on the
+        # side the surface moved to: two calls that at worst still shrink
+        # the bracket, and at best leave only WARM_BRACKET to bisect.
+        at = np.minimum(np.searchsorted(previous.edges, keys), len(previous.edges) - 1)
+        w = np.flatnonzero(active & (previous.edges[at] == keys))
+        old = previous.crossings[at[w]]
+        moved_up = _edge_inside(sdf, lower[w], axis[w], old, origin, step) == lower_inside[w]
+        a[w[moved_up]] = old[moved_up]
+        b[w[~moved_up]] = old[~moved_up]
+        probe = np.clip(np.where(moved_up, old + WARM_BRACKET, old - WARM_BRACKET), 0, 1)
+        lower_side = _edge_inside(sdf, lower[w], axis[w], probe, origin, step) == lower_inside[w]
+        a[w[lower_side]] = np.maximum(a[w[lower_side]], probe[lower_side])
+        b[w[~lower_side]] = np.minimum(b[w[~lower_side]], probe[~lower_side])
+
+    for level in range(recursion_levels):
+        _report(progress, "bisecting", level / recursion_levels)
+        active &= (b - a) >= bracket_tol
+        idx = np.flatnonzero(active)
+        if len(idx) == 0:
+            break
+        mid = (a[idx] + b[idx]) / 2
+        mid_val = _edge_values(sdf, lower[idx], axis[idx], mid, origin, step)
+        converged = np.abs(mid_val) < tol
+        same_as_lower = (mid_val < 0) == lower_inside[idx]
+        a[idx] = np.where(converged | same_as_lower, mid, a[idx])
+        b[idx] = np.where(converged | ~same_as_lower, mid, b[idx])
+        active[idx[converged]] = False
+
+    # Edges without a usable sign change keep the linear-interpolation vertex
+    crossing = np.where(crossed & (recursion_levels > 0), (a + b) / 2, t)
+    points = lower.astype(float)
+    points[rows, axis] += crossing
+    points[~on_edge] = verts[~on_edge]
+    order = np.argsort(keys[on_edge], kind="stable")
+    return origin + points * step, keys[on_edge][order], crossing[on_edge][order]
+
+
+def mesh_frame(sdf, samples=2**22, bounds=box_bounds(), brick_size=8, previous=None, recursion_levels=30,
+               tol=1e-8, bracket_tol=1e-3, clean=True, verbose=True, progress=None):
+    """One frame: band sampling, marching cubes, then bisection of the
+    vertices against the SDF (bisect_on_grid). Returns (mesh, state,
+    n_sampled_bricks)."""
+    values, origin, step, state, n_sampled = sample_band(sdf, samples=samples, bounds=bounds,
+                                                         brick_size=brick_size, previous=previous,
+                                                         progress=progress)
+    if not ((values < 0).any() and (values >= 0).any()):
+        return meshio.Mesh(np.zeros((0, 3)), cells={"triangle": np.zeros((0, 3), dtype=int)}), state, n_sampled
+    verts, faces, _normals, _values = marching_cubes(values, 0)
+    points, state.edges, state.crossings = bisect_on_grid(
+        sdf, verts.astype(float), values, origin, step, previous=previous, tol=tol, bracket_tol=bracket_tol,
+        recursion_levels=recursion_levels, progress=progress)
+    mesh = meshio.Mesh(points, cells={"triangle": faces})
+    if clean:
+        mesh = clean_mesh(mesh, verbose=verbose)
+    return mesh, state, n_sampled
+
+
+def mesh_sequence(settings_list, output_dir, samples=2**22, bounds=box_bounds(), brick_size=8,
+                  prefix="frame", extension="ply", warm_start=True, verbose=True, **options):
+    """Mesh each settings dict to `<output_dir>/<prefix>_<n>.<extension>`,
+    each frame warm-started from the one before. options go to mesh_frame."""
+    from fractal_printer.mesh.fractal_sdfs import polynomial_julia_sdf
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    digits = len(str(len(settings_list) - 1))
+    state = None
+    paths = []
+    for n, settings in enumerate(settings_list):
+        mesh, next_state, n_sampled = mesh_frame(polynomial_julia_sdf(**settings), samples=samples,
+                                                 bounds=bounds, brick_size=brick_size,
+                                                 previous=state if warm_start else None,
+                                                 verbose=False, **options)
+        state = next_state
+        path = output_dir / f"{prefix}_{n:0{digits}d}.{extension}"
+        mesh.write(path)
+        paths.append(path)
+        if verbose:
+            print(f"[{n + 1}/{len(settings_list)}] {path.name}: {len(mesh.cells[0].data)} triangles, "
+                  f"{n_sampled} of {state.band.size} bricks sampled")
+    return paths
+
+
+def render_sequence(settings_list, output_dir, width=256, height=256, camera=None, turntable=0.0,
+                    prefix="frame", verbose=True, **kwargs):
+    """CPU-render each settings dict to `<output_dir>/<prefix>_<n>.png`,
+    orbiting the camera by `turntable` radians over the sequence. kwargs go
+    to cpu_renderer.render."""
+    from fractal_printer.preview import cpu_renderer
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    camera = {**cpu_renderer.DEFAULT_CAMERA, **(camera or {})}
+    digits = len(str(len(settings_list) - 1))
+    paths = []
+    for n, settings in enumerate(settings_list):
+        frame_camera = dict(camera, theta=camera["theta"] + turntable * n / max(len(settings_list), 1))
+        image = cpu_renderer.render(settings, width=width, height=height, camera=frame_camera, **kwargs)
+        path = output_dir / f"{prefix}_{n:0{digits}d}.png"
+        paths.append(cpu_renderer.save_png(image, path))
+        if verbose:
+            print(f"[{n + 1}/{len(settings_list)}] {path.name}")
+    return paths
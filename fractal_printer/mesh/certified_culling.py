@@ -0,0 +1,340 @@
+# Certified block classification for polynomial_julia_sdf: bounds on the SDF
+# over a whole axis-aligned box, so samplers can skip blocks that are provably
+# all outside or all inside instead of trusting the distance estimate (which
+# is a heuristic -- hence fudge_factor -- and can miss thin filaments).
+#
+# The orbit of the box is carried in reduced affine arithmetic: each
+# quaternion component is c0 + c1 e1 + c2 e2 + c3 e3 + r [-1, 1], where e1..e3
+# in [-1, 1] are the box's x, y, z and r collects everything non-linear (and
+# float rounding, padded by _ROUNDING). Unlike plain intervals this keeps the
+# correlation between components through quaternion products, so enclosures
+# stay tight over many iterations on small boxes.
+#
+# Once part of a box escapes, the escaped points would blow the enclosure up,
+# so the rest continues on bounds of |z| (clipped to the bailout radius) and
+# |z| / |zp| alone, which quaternion norms being multiplicative makes cheap.
+#
+# The SDF over the box is then bounded by the union of: the distance estimate
+# of points that may escape at iteration n, for every such n, and
+# interior_epsilon if some may never escape. The sign of those bounds is
+# certified, not estimated. Boxes straddling the surface (or too large to
+# prove anything about) come back UNKNOWN; classify_boxes and certify_region
+# split those into octants.
+import numpy as np
+from numba import njit, prange
+
+from fractal_printer.mesh.mesh_generation import box_bounds, grid_step
+
+# Same codes as sdf_volume's fill table, with 0 meaning "not certified"
+OUTSIDE, UNKNOWN, INSIDE = 1, 0, -1
+
+# polynomial_julia_sdf's defaults, for settings dicts (as the preview copies
+# them) that leave some out
+SDF_DEFAULTS = {"slice": 0.0, "power": 2, "iterations": 50, "bailout": 10000**2, "offset": 0.0,
+                "interior_epsilon": 1e-3, "fudge_factor": 0.9}
+
+# Relative padding per affine operation, covering a few roundings of 2**-53
+_ROUNDING = 2.0**-50
+
+# Noise symbols per component: centre, x, y, z, radius
+_WIDTH = 5
+
+# Quaternion product as (output, a component, b component, sign), as in _qmul
+_QMUL_TERMS = np.array([
+    [[0, 0, 1], [1, 1, -1], [2, 2, -1], [3, 3, -1]],
+    [[0, 1, 1], [1, 0, 1], [2, 3, 1], [3, 2, -1]],
+    [[0, 2, 1], [1, 3, -1], [2, 0, 1], [3, 1, 1]],
+    [[0, 3, 1], [1, 2, 1], [2, 1, -1], [3, 0, 1]],
+], dtype=np.int64)
+
+
+@njit(inline='always')
+def _af_mul_add(a, b, sign, out):
+    # out += sign * a * b for affine scalars a, b
+    ra = a[4]; rb = b[4]
+    for i in range(1, 4):
+        ra += abs(a[i]); rb += abs(b[i])
+    c0 = a[0] * b[0]
+    out[0] += sign * c0
+    magnitude = abs(c0)
+    for i in range(1, 4):
+        ci = a[0] * b[i] + b[0] * a[i]
+        out[i] += sign * ci
+        magnitude += abs(ci)
+    r = abs(a[0]) * b[4] + abs(b[0]) * a[4] + ra * rb
+    out[4] += r + _ROUNDING * (magnitude + r)
+
+
+@njit(inline='always')
+def _af_qmul(a, b, out):
+    # out = a * b for affine quaternions of shape (4, _WIDTH)
+    out[:] = 0.0
+    for o in range(4):
+        for t in range(4):
+            _af_mul_add(a[_QMUL_TERMS[o, t, 0]], b[_QMUL_TERMS[o, t, 1]], _QMUL_TERMS[o, t, 2], out[o])
+
+
+@njit(inline='always')
+def _af_axpy(scale, a, out):
+    # out += scale * a
+    for c in range(4):
+        for i in range(4):
+            out[c, i] += scale * a[c, i]
+            out[c, 4] += _ROUNDING * abs(scale * a[c, i])
+        out[c, 4] += abs(scale) * a[c, 4]
+
+
+@njit(inline='always')
+def _norm2_range(a):
+    # Bounds on |q|^2 over the affine quaternion a: the upper bound from each
+    # component's interval, the lower bound the better of that and the affine
+    # square (which sees that components can't all be small at once)
+    square = np.zeros(_WIDTH)
+    for c in range(4):
+        _af_mul_add(a[c], a[c], 1.0, square)
+    lo2 = square[0] - abs(square[1]) - abs(square[2]) - abs(square[3]) - square[4]
+    interval_lo2 = 0.0
+    hi2 = 0.0
+    for c in range(4):
+        r = a[c, 4] + abs(a[c, 1]) + abs(a[c, 2]) + abs(a[c, 3])
+        lo = a[c, 0] - r
+        hi = a[c, 0] + r
+        hi2 += max(lo * lo, hi * hi)
+        if lo > 0:
+            interval_lo2 += lo * lo
+        elif hi < 0:
+            interval_lo2 += hi * hi
+    return max(lo2, interval_lo2) * (1 - 4 * _ROUNDING), hi2 * (1 + 4 * _ROUNDING)
+
+
+@njit(inline='always')
+def _escape_bounds(z2_lo, z2_hi, zp2_lo, zp2_hi, bailout, power, dmin, dmax):
+    # Widen [dmin, dmax] by the estimate of points that may escape now, with
+    # z2 in (bailout, z2_hi]: it grows with z2 and shrinks with |zp|^2
+    # (clipped at 1e-6, as in _julia_distance)
+    z2_min = max(z2_lo, bailout)
+    dmin = min(dmin, np.sqrt(z2_min / max(zp2_hi, 1e-6)) * np.log(z2_min) / (2 * power))
+    dmax = max(dmax, np.sqrt(z2_hi / max(zp2_lo, 1e-6)) * np.log(z2_hi) / (2 * power))
+    return dmin, dmax
+
+
+@njit(inline='always')
+def _box_bounds(lo, hi, coeffs, slice_w, power, iterations, bailout, interior_epsilon):
+    # Bounds on the unscaled, un-offset distance over the box (as in
+    # _julia_distance before `(dist - offset) * fudge_factor`)
+    n_terms = coeffs.shape[0]
+    z = np.zeros((4, _WIDTH)); zp = np.zeros((4, _WIDTH))
+    z1 = np.empty((4, _WIDTH)); zp1 = np.empty((4, _WIDTH))
+    power_ = np.empty((4, _WIDTH)); prev = np.empty((4, _WIDTH))
+    product = np.empty((4, _WIDTH)); c = np.zeros((4, _WIDTH))
+    for ax in range(3):
+        z[ax, 0] = (lo[ax] + hi[ax]) / 2
+        z[ax, ax + 1] = (hi[ax] - lo[ax]) / 2
+    z[3, 0] = slice_w
+    zp[0, 0] = 1.0
+
+    dmin = np.inf
+    dmax = -np.inf
+    n = 0
+    while n < iterations:
+        n += 1
+        power_[:] = 0.0; power_[0, 0] = 1.0
+        prev[:] = 0.0
+        z1[:] = 0.0; zp1[:] = 0.0
+        for t in range(n_terms):
+            for k in range(4):
+                c[k, 0] = coeffs[t, k]
+            _af_qmul(power_, c, product)
+            _af_axpy(1.0, product, z1)
+            if t >= 1:
+                _af_qmul(prev, c, product)
+                _af_axpy(float(t), product, zp1)
+            prev[:] = power_
+            if t < n_terms - 1:
+                _af_qmul(power_, z, product)
+                power_[:] = product
+        _af_qmul(zp1, zp, product)
+        zp[:] = product
+        z[:] = z1
+
+        z2_lo, z2_hi = _norm2_range(z)
+        zp2_lo, zp2_hi = _norm2_range(zp)
+        if z2_hi > bailout:
+            dmin, dmax = _escape_bounds(z2_lo, z2_hi, zp2_lo, zp2_hi, bailout, power, dmin, dmax)
+            if z2_lo > bailout:
+                return dmin, dmax
+            # Part of the box has escaped, and carrying it along would blow
+            # the enclosure up; switch to bounds on |z| and |zp| for the rest
+            return _magnitude_bounds(coeffs, iterations - n, bailout, power, interior_epsilon,
+                                     np.sqrt(z2_lo), np.sqrt(bailout), np.sqrt(z2_lo / zp2_hi),
+                                     np.sqrt(bailout / zp2_lo) if zp2_lo > 0 else np.inf, dmin, dmax)
+    # Nothing has escaped
+    return min(dmin, interior_epsilon), max(dmax, interior_epsilon)
+
+
+@njit(inline='always')
+def _magnitude_bounds(coeffs, iterations, bailout, power, interior_epsilon, m_lo, m_hi, r_lo, r_hi,
+                      dmin, dmax):
+    # Continue from |z| in [m_lo, m_hi] and |z| / |zp| in [r_lo, r_hi].
+    # Quaternion norms are multiplicative, so |c z^t| = |c| |z|^t and the
+    # triangle inequality bounds |P(z)| by m^top (|c_top| +- sum_{t<top} |c_t|
+    # m^(t-top)), and similarly |P'(z)|. Each bracket is monotonic in m, and
+    # so is the ratio |P(z)| / (|z| |P'(z)|) that scales |z| / |zp|: all lower
+    # bounds (and the ratio's upper bound) are taken at m_lo.
+    n_terms = coeffs.shape[0]
+    top = n_terms - 1
+    norms = np.empty(n_terms)
+    for t in range(n_terms):
+        norms[t] = np.sqrt(coeffs[t, 0]**2 + coeffs[t, 1]**2 + coeffs[t, 2]**2 + coeffs[t, 3]**2)
+    pad = 1e-12
+    for _ in range(iterations):
+        up = 0.0
+        for t in range(n_terms):
+            up += norms[t] * m_hi ** t
+        up *= 1 + pad
+        low = 0.0
+        if m_lo > 0 and top >= 1:
+            plus = norms[top]; minus = norms[top]
+            d_plus = top * norms[top]; d_minus = top * norms[top]
+            for t in range(top):
+                minus -= norms[t] * m_lo ** (t - top)
+                plus += norms[t] * m_lo ** (t - top)
+                if t >= 1:
+                    d_minus -= t * norms[t] * m_lo ** (t - top)
+                    d_plus += t * norms[t] * m_lo ** (t - top)
+            low = m_lo ** top * max(minus, 0.0) * (1 - pad)
+            r_lo *= max(minus, 0.0) / d_plus * (1 - pad)
+            r_hi = r_hi * plus / d_minus * (1 + pad) if d_minus > 0 else np.inf
+        else:
+            r_lo = 0.0
+            r_hi = np.inf
+        if up * up > bailout:
+            # Distance estimate |z| / max(|zp|, 1e-3) * log(z2) / (2 power)
+            z2_min = max(low * low, bailout)
+            dmin = min(dmin, min(r_lo, np.sqrt(z2_min) / 1e-3) * np.log(z2_min) / (2 * power))
+            dmax = max(dmax, min(r_hi, up / 1e-3) * np.log(up * up) / (2 * power))
+            if low * low > bailout:
+                return dmin, dmax
+        m_lo = low
+        m_hi = min(up, np.sqrt(bailout))
+    # Some points may never escape
+    return min(dmin, interior_epsilon), max(dmax, interior_epsilon)
+
+
+@njit(parallel=True, cache=True)
+def _distance_bounds(lo, hi, coeffs, slice_w, power, iterations, bailout, offset, interior_epsilon,
+                     fudge_factor, out_lo, out_hi):
+    for b in prange(lo.shape[0]):
+        dmin, dmax = _box_bounds(lo[b], hi[b], coeffs, slice_w, power, iterations, bailout, interior_epsilon)
+        out_lo[b] = (dmin - offset) * fudge_factor
+        out_hi[b] = (dmax - offset) * fudge_factor
+
+
+def _parameters(settings):
+    settings = {**SDF_DEFAULTS, **settings}
+    if settings["bailout"] <= 1:
+        raise ValueError("Certified bounds need bailout > 1, where the distance estimate grows with |z|")
+    if settings["fudge_factor"] <= 0:
+        raise ValueError("fudge_factor must be positive")
+    coeffs = np.ascontiguousarray(settings["coefficients"], dtype=np.float64).reshape(-1, 4)
+    # Trailing zero terms add exactly nothing, but their powers of z would
+    # inflate (and may overflow) the enclosure
+    nonzero = np.flatnonzero(np.any(coeffs != 0, axis=1))
+    coeffs = coeffs[:nonzero[-1] + 1] if len(nonzero) else coeffs[:1]
+    return (coeffs, float(settings["slice"]), float(settings["power"]), int(settings["iterations"]),
+            float(settings["bailout"]), float(settings["offset"]), float(settings["interior_epsilon"]),
+            float(settings["fudge_factor"]))
+
+
+def distance_bounds(lo, hi, settings):
+    """Lower and upper bounds on polynomial_julia_sdf(**settings) over each
+    box [lo[b], hi[b]] (arrays of shape (n, 3))."""
+    lo = np.ascontiguousarray(np.atleast_2d(lo), dtype=np.float64)
+    hi = np.ascontiguousarray(np.atleast_2d(hi), dtype=np.float64)
+    out_lo = np.empty(len(lo))
+    out_hi = np.empty(len(lo))
+    _distance_bounds(lo, hi, *_parameters(settings), out_lo, out_hi)
+    return out_lo, out_hi
+
+
+def _octants(lo, hi):
+    # Split each box into its 8 octants, in order
+    half = (hi - lo) / 2
+    corners = np.stack(np.meshgrid(*[np.arange(2)] * 3, indexing="ij"), axis=-1).reshape(-1, 3)
+    lo = (lo[:, None] + corners * half[:, None]).reshape(-1, 3)
+    return lo, lo + np.repeat(half, 8, axis=0)
+
+
+def classify_boxes(lo, hi, settings, max_depth=0):
+    """OUTSIDE if the SDF is certainly positive over the whole box, INSIDE if
+    certainly negative, UNKNOWN otherwise (mixed, or not provable).
+
+    Boxes that can't be certified whole are split into octants up to
+    `max_depth` times, and certified if every piece agrees."""
+    lo = np.atleast_2d(np.asarray(lo, dtype=float))
+    hi = np.atleast_2d(np.asarray(hi, dtype=float))
+    owner = np.arange(len(lo))
+    seen_outside = np.zeros(len(lo), dtype=bool)
+    seen_inside = np.zeros(len(lo), dtype=bool)
+    unresolved = np.zeros(len(lo), dtype=bool)
+    for depth in range(max_depth + 1):
+        d_lo, d_hi = distance_bounds(lo, hi, settings)
+        seen_outside[owner[d_lo > 0]] = True
+        seen_inside[owner[d_hi < 0]] = True
+        pending = (d_lo <= 0) & (d_hi >= 0)
+        if depth == max_depth:
+            unresolved[owner[pending]] = True
+            break
+        # Boxes with pieces on both sides are settled already
+        pending &= ~(seen_outside & seen_inside)[owner]
+        if not pending.any():
+            break
+        lo, hi = _octants(lo[pending], hi[pending])
+        owner = np.repeat(owner[pending], 8)
+
+    codes = np.full(len(seen_outside), UNKNOWN, dtype=np.int8)
+    codes[seen_outside & ~seen_inside & ~unresolved] = OUTSIDE
+    codes[seen_inside & ~seen_outside & ~unresolved] = INSIDE
+    return codes
+
+
+def classify_bricks(settings, samples=2**24, bounds=box_bounds(), brick_size=16, max_depth=3):
+    """Classify the bricks of the grid sample_grid uses for `samples`/`bounds`:
+    codes[i, j, k] covers the samples [i, j, k] * brick_size up to and
+    including the first layer of the next brick, i.e. the brick_size + 1
+    samples a side that sdf_volume.write_volume decides a brick on, so
+    certified bricks need no sampling. See classify_boxes for max_depth."""
+    (x0, y0, z0), (x1, y1, z1) = bounds
+    step = grid_step(bounds, samples)
+    origin = np.array([x0, y0, z0], dtype=float)
+    shape = np.array([len(np.arange(a, b, step)) for a, b in zip(bounds[0], bounds[1])])
+    bricks = -(-shape // brick_size)
+    index = np.stack(np.meshgrid(*[np.arange(n) for n in bricks], indexing="ij"), axis=-1).reshape(-1, 3)
+    lo = origin + index * brick_size * step
+    hi = lo + brick_size * step
+    return classify_boxes(lo, hi, settings, max_depth=max_depth).reshape(tuple(bricks))
+
+
+def certify_region(settings, bounds=box_bounds(), max_depth=6, verbose=True):
+    """Octree over `bounds`: boxes that can't be certified are split into 8,
+    down to `max_depth` levels. Returns (lo, hi, codes) for every leaf; the
+    leaves tile `bounds`, and UNKNOWN ones are those left at max_depth."""
+    lo = np.array([bounds[0]], dtype=float)
+    hi = np.array([bounds[1]], dtype=float)
+    leaves_lo, leaves_hi, leaves_codes = [], [], []
+    for depth in range(max_depth + 1):
+        codes = classify_boxes(lo, hi, settings)
+        final = (codes != UNKNOWN) | (depth == max_depth)
+        leaves_lo.append(lo[final]); leaves_hi.append(hi[final]); leaves_codes.append(codes[final])
+        lo, hi = lo[~final], hi[~final]
+        if not len(lo):
+            break
+        lo, hi = _octants(lo, hi)
+
+    lo, hi, codes = np.concatenate(leaves_lo), np.concatenate(leaves_hi), np.concatenate(leaves_codes)
+    if verbose:
+        volume = np.prod(hi - lo, axis=1)
+        total = volume.sum()
+        print(f"Certified {volume[codes == OUTSIDE].sum() / total:.1%} outside and "
+              f"{volume[codes == INSIDE].sum() / total:.1%} inside in {len(codes)} boxes")
+    return lo, hi, codes
@@ -97,53 +97,64 @@ def _qmul(w1, x1, y1, z1, w2, x2, y2, z2):
     return w, x, y, z
 
 
+@njit(inline='always')
+def _julia_distance(px, py, pz, coeffs, slice_w, power, iterations, bailout,
+                    offset, interior_epsilon, fudge_factor):
+    n_terms = coeffs.shape[0]
+    # z starts as the point lifted into quaternion space (matches
+    # general_julia_sdf's convention: point coords first, slice last).
+    zw = px; zx = py; zy = pz; zz = slice_w
+    zpw = 1.0; zpx = 0.0; zpy = 0.0; zpz = 0.0  # running derivative, starts at the identity
+    escaped = False
+    z2 = 0.0
+
+    for _ in range(iterations):
+        # Evaluate the polynomial and its derivative at the current z via
+        # an incrementally-tracked running power, instead of recomputing
+        # z**i from scratch per term.
+        pow_w = 1.0; pow_x = 0.0; pow_y = 0.0; pow_z = 0.0
+        prev_w = 0.0; prev_x = 0.0; prev_y = 0.0; prev_z = 0.0
+        z1w = 0.0; z1x = 0.0; z1y = 0.0; z1z = 0.0
+        zp1w = 0.0; zp1x = 0.0; zp1y = 0.0; zp1z = 0.0
+
+        for t in range(n_terms):
+            cw = coeffs[t, 0]; cx = coeffs[t, 1]; cy = coeffs[t, 2]; cz = coeffs[t, 3]
+            mw, mx, my, mz = _qmul(pow_w, pow_x, pow_y, pow_z, cw, cx, cy, cz)
+            z1w += mw; z1x += mx; z1y += my; z1z += mz
+            if t >= 1:
+                dw, dx, dy, dz = _qmul(prev_w, prev_x, prev_y, prev_z, cw, cx, cy, cz)
+                zp1w += t*dw; zp1x += t*dx; zp1y += t*dy; zp1z += t*dz
+            prev_w, prev_x, prev_y, prev_z = pow_w, pow_x, pow_y, pow_z
+            if t < n_terms - 1:
+                pow_w, pow_x, pow_y, pow_z = _qmul(pow_w, pow_x, pow_y, pow_z, zw, zx, zy, zz)
+
+        zpw, zpx, zpy, zpz = _qmul(zp1w, zp1x, zp1y, zp1z, zpw, zpx, zpy, zpz)
+        zw, zx, zy, zz = z1w, z1x, z1y, z1z
+        z2 = zw*zw + zx*zx + zy*zy + zz*zz
+        if z2 > bailout:
+            escaped = True
+            break
+
+    if escaped:
+        zp2 = zpw*zpw + zpx*zpx + zpy*zpy + zpz*zpz
+        if zp2 < 1e-6:
+            zp2 = 1e-6
+        dist = np.sqrt(z2/zp2) * np.log(z2) / (2*power)
+    else:
+        dist = interior_epsilon
+    return (dist - offset) * fudge_factor
+
+
 @njit(parallel=True, cache=True)
 def _polynomial_julia_kernel(points, coeffs, slice_w, power, iterations, bailout,
                               offset, interior_epsilon, fudge_factor, out):
-    n_terms = coeffs.shape[0]
+    # Single-point evaluation lives in _julia_distance so other numba kernels
+    # (e.g. the CPU preview renderer) can call it per-sample without going
+    # through an array round trip.
     for i in prange(points.shape[0]):
-        # z starts as the point lifted into quaternion space (matches
-        # general_julia_sdf's convention: point coords first, slice last).
-        zw = points[i, 0]; zx = points[i, 1]; zy = points[i, 2]; zz = slice_w
-        zpw = 1.0; zpx = 0.0; zpy = 0.0; zpz = 0.0  # running derivative, starts at the identity
-        escaped = False
-        z2 = 0.0
-
-        for _ in range(iterations):
-            # Evaluate the polynomial and its derivative at the current z via
-            # an incrementally-tracked running power, instead of recomputing
-            # z**i from scratch per term.
-            pow_w = 1.0; pow_x = 0.0; pow_y = 0.0; pow_z = 0.0
-            prev_w = 0.0; prev_x = 0.0; prev_y = 0.0; prev_z = 0.0
-            z1w = 0.0; z1x = 0.0; z1y = 0.0; z1z = 0.0
-            zp1w = 0.0; zp1x = 0.0; zp1y = 0.0; zp1z = 0.0
-
-            for t in range(n_terms):
-                cw = coeffs[t, 0]; cx = coeffs[t, 1]; cy = coeffs[t, 2]; cz = coeffs[t, 3]
-                mw, mx, my, mz = _qmul(pow_w, pow_x, pow_y, pow_z, cw, cx, cy, cz)
-                z1w += mw; z1x += mx; z1y += my; z1z += mz
-                if t >= 1:
-                    dw, dx, dy, dz = _qmul(prev_w, prev_x, prev_y, prev_z, cw, cx, cy, cz)
-                    zp1w += t*dw; zp1x += t*dx; zp1y += t*dy; zp1z += t*dz
-                prev_w, prev_x, prev_y, prev_z = pow_w, pow_x, pow_y, pow_z
-                if t < n_terms - 1:
-                    pow_w, pow_x, pow_y, pow_z = _qmul(pow_w, pow_x, pow_y, pow_z, zw, zx, zy, zz)
-
-            zpw, zpx, zpy, zpz = _qmul(zp1w, zp1x, zp1y, zp1z, zpw, zpx, zpy, zpz)
-            zw, zx, zy, zz = z1w, z1x, z1y, z1z
-            z2 = zw*zw + zx*zx + zy*zy + zz*zz
-            if z2 > bailout:
-                escaped = True
-                break
-
-        if escaped:
-            zp2 = zpw*zpw + zpx*zpx + zpy*zpy + zpz*zpz
-            if zp2 < 1e-6:
-                zp2 = 1e-6
-            dist = np.sqrt(z2/zp2) * np.log(z2) / (2*power)
-        else:
-            dist = interior_epsilon
-        out[i] = (dist - offset) * fudge_factor
+        out[i] = _julia_distance(points[i, 0], points[i, 1], points[i, 2], coeffs,
+                                 slice_w, power, iterations, bailout,
+                                 offset, interior_epsilon, fudge_factor)
 
 
 @d3.sdf3
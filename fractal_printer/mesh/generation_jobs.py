@@ -0,0 +1,136 @@
+# Background mesh generation: runs generate_mesh in worker processes and
+# streams stage progress back to the submitting process.
+import multiprocessing
+import queue
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from itertools import count
+
+# Minimum gap between progress messages for the same stage, so sampling (which
+# reports once per SDF batch) doesn't flood the queue.
+PROGRESS_INTERVAL = 0.1
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = "pending", "running", "done", "failed", "cancelled"
+
+
+@dataclass
+class GenerationJob:
+    job_id: int
+    settings: dict
+    options: dict
+    save_path: str
+    status: str = PENDING
+    stage: str = ""
+    fraction: float = None
+    error: str = None
+    future: object = field(default=None, repr=False)
+    cancel_event: object = field(default=None, repr=False)
+
+
+def _run_job(job_id, settings, options, save_path, messages, cancel_event):
+    # Runs in the worker process. Imports are local so the parent process
+    # (e.g. the Qt preview) doesn't pay for numba/sdf start-up.
+    from fractal_printer.mesh import fractal_sdfs as fs, mesh_generation as mg
+
+    last = {"stage": None, "time": 0.0}
+
+    def progress(stage, fraction):
+        if cancel_event.is_set():
+            raise mg.GenerationCancelled()
+        now = time.monotonic()
+        if stage != last["stage"] or now - last["time"] >= PROGRESS_INTERVAL:
+            last["stage"], last["time"] = stage, now
+            messages.put((job_id, "progress", stage, fraction))
+
+    try:
+        messages.put((job_id, RUNNING, None, None))
+        mg.generate_mesh(fs.polynomial_julia_sdf(**settings), save_path=save_path,
+                         verbose=False, progress=progress, **options)
+    except mg.GenerationCancelled:
+        messages.put((job_id, CANCELLED, None, None))
+    except Exception:
+        messages.put((job_id, FAILED, traceback.format_exc(), None))
+    else:
+        messages.put((job_id, DONE, save_path, None))
+
+
+class GenerationQueue:
+    """Queue of generate_mesh jobs run in background processes.
+
+    Call poll() regularly (e.g. from a Qt timer) to collect progress; it never
+    blocks. Workers default to 1: polynomial_julia_sdf already uses every core,
+    so extra workers mostly add memory pressure."""
+
+    def __init__(self, workers=1):
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = workers
+        self._manager = self._context.Manager()
+        self._messages = self._manager.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=self._context)
+        self._ids = count(1)
+        self._cancelled_pending = []
+        self.jobs = {}
+
+    def submit(self, settings, save_path, **options):
+        # options are passed through to generate_mesh (samples, recursion_levels, ...)
+        job = GenerationJob(next(self._ids), dict(settings), options, str(save_path))
+        job.cancel_event = self._manager.Event()
+        args = (_run_job, job.job_id, job.settings, job.options, job.save_path, self._messages, job.cancel_event)
+        try:
+            job.future = self._executor.submit(*args)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory) and took the pool with it; the
+            # jobs it had are reported FAILED by poll(), later ones get a new pool
+            self._executor.shutdown(wait=False)
+            self._executor = ProcessPoolExecutor(max_workers=self._workers, mp_context=self._context)
+            job.future = self._executor.submit(*args)
+        self.jobs[job.job_id] = job
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs[job_id]
+        if job.status in (DONE, FAILED, CANCELLED):
+            return
+        if job.future.cancel():
+            # Never started, so no worker will report it; poll() does instead
+            job.status = CANCELLED
+            self._cancelled_pending.append(job)
+        else:
+            job.cancel_event.set()
+
+    def poll(self):
+        """Apply queued worker messages to self.jobs and return the jobs that changed."""
+        changed = {job.job_id: job for job in self._cancelled_pending}
+        self._cancelled_pending.clear()
+        while True:
+            try:
+                job_id, kind, a, b = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            job = self.jobs[job_id]
+            if kind == "progress":
+                job.stage, job.fraction = a, b
+            else:
+                job.status = kind
+                if kind == FAILED:
+                    job.error = a
+            changed[job_id] = job
+        for job in self.active():
+            # A worker that died (e.g. out of memory) never reports back
+            if job.future.done() and not job.future.cancelled() and job.future.exception() is not None:
+                job.status = FAILED
+                job.error = repr(job.future.exception())
+                changed[job.job_id] = job
+        return list(changed.values())
+
+    def active(self):
+        return [j for j in self.jobs.values() if j.status in (PENDING, RUNNING)]
+
+    def shutdown(self):
+        for job in self.active():
+            self.cancel(job.job_id)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._manager.shutdown()
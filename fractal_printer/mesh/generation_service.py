@@ -0,0 +1,422 @@
+# Local generation service: one generate_mesh queue shared by everyone on a
+# workstation, over HTTP on localhost (or a unix socket), instead of each
+# person's notebook kernel competing for the same cores and RAM.
+#
+# - Jobs live in a sqlite database, so the queue survives restarts; jobs that
+#   were running when the server stopped are queued again.
+# - Higher priority runs first, then oldest first. A job starts only once its
+#   core and memory reservation fits in what is free; cores are enforced by
+#   limiting the worker's numba threads, memory is admission control only.
+# - Identical settings + options are one job: submitting them again returns
+#   the existing job, and its mesh in the results store.
+# - Progress streams as newline-delimited JSON from /jobs/<id>/events.
+#
+# Endpoints: POST /jobs, GET /jobs, GET /jobs/<id>, DELETE /jobs/<id>,
+# GET /jobs/<id>/events, GET /jobs/<id>/result.
+import asyncio
+import hashlib
+import http.client
+import json
+import multiprocessing
+import os
+import queue
+import re
+import socket
+import sqlite3
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from fractal_printer.mesh.generation_jobs import PENDING, RUNNING, DONE, FAILED, CANCELLED, _run_job
+from fractal_printer.paths import OUTPUT_DIR
+
+DEFAULT_ROOT = OUTPUT_DIR / "service"
+DEFAULT_PORT = 8765
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# How often the scheduler drains worker messages and starts queued jobs
+SCHEDULE_INTERVAL = 0.1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    options TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    cores INTEGER NOT NULL DEFAULT 1,
+    memory_gb REAL NOT NULL DEFAULT 1,
+    status TEXT NOT NULL,
+    stage TEXT,
+    fraction REAL,
+    error TEXT,
+    result TEXT,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL
+)
+"""
+_COLUMNS = ("id", "key", "settings", "options", "priority", "cores", "memory_gb", "status", "stage",
+            "fraction", "error", "result", "submitted", "started", "finished")
+
+
+def job_key(settings, options):
+    """Deduplication key: identical settings and generate_mesh options give
+    identical meshes."""
+    canonical = json.dumps({"settings": settings, "options": options}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _total_memory_gb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**30
+    except (ValueError, OSError, AttributeError):
+        return 16.0
+
+
+def _service_worker(cores, job_id, settings, options, save_path, messages, cancel_event):
+    # Runs in the job's own process; numba's thread count is the core reservation
+    import numba
+    numba.set_num_threads(max(1, min(cores, numba.config.NUMBA_NUM_THREADS)))
+    _run_job(job_id, settings, options, save_path, messages, cancel_event)
+
+
+class GenerationService:
+    """The job store and scheduler. serve() exposes it over HTTP."""
+
+    def __init__(self, root=DEFAULT_ROOT, cores=None, memory_gb=None):
+        self.root = Path(root)
+        self.results = self.root / "results"
+        self.results.mkdir(parents=True, exist_ok=True)
+        self.cores = cores or os.cpu_count()
+        self.memory_gb = memory_gb or _total_memory_gb()
+
+        # Created here, used from whichever thread runs serve() (e.g. one next
+        # to the Qt event loop); only the event loop touches it after that
+        self._db = sqlite3.connect(self.root / "jobs.sqlite3", check_same_thread=False)
+        self._db.execute(_SCHEMA)
+        # Whatever was running when the last server stopped starts over
+        self._db.execute("UPDATE jobs SET status = ?, stage = NULL, fraction = NULL, started = NULL "
+                         "WHERE status = ?", (PENDING, RUNNING))
+        self._db.commit()
+
+        self._context = multiprocessing.get_context("spawn")
+        self._messages = self._context.Queue()
+        self._running = {}        # job id -> (process, cancel event)
+        self._subscribers = {}    # job id -> set of asyncio.Queue
+
+    # Job store
+
+    def _row(self, row):
+        job = dict(zip(_COLUMNS, row))
+        job["settings"] = json.loads(job["settings"])
+        job["options"] = json.loads(job["options"])
+        return job
+
+    def job(self, job_id):
+        row = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def jobs(self, status=None):
+        query = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        if status:
+            return [self._row(r) for r in self._db.execute(query + " WHERE status = ? ORDER BY id", (status,))]
+        return [self._row(r) for r in self._db.execute(query + " ORDER BY id")]
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+        self._db.commit()
+        job = self.job(job_id)
+        for subscriber in self._subscribers.get(job_id, ()):
+            subscriber.put_nowait(job)
+        return job
+
+    def submit(self, settings, options=None, priority=0, cores=1, memory_gb=1.0):
+        """Queue a job, or return the existing one for the same settings and
+        options (raising its priority if the new request's is higher)."""
+        options = dict(options or {})
+        if cores > self.cores or memory_gb > self.memory_gb:
+            raise ValueError(f"Reservation of {cores} cores / {memory_gb} GB exceeds the service's "
+                             f"{self.cores} cores / {self.memory_gb:.1f} GB")
+        key = job_key(settings, options)
+        for existing in reversed(self._jobs_by_key(key)):
+            if existing["status"] == DONE and not Path(existing["result"]).exists():
+                continue
+            if existing["status"] in (PENDING, RUNNING, DONE):
+                if existing["status"] == PENDING and priority > existing["priority"]:
+                    existing = self._update(existing["id"], priority=priority)
+                return dict(existing, deduplicated=True)
+
+        cursor = self._db.execute(
+            "INSERT INTO jobs (key, settings, options, priority, cores, memory_gb, status, result, submitted) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, json.dumps(settings), json.dumps(options), int(priority), int(cores), float(memory_gb),
+             PENDING, str(self.results / f"{key[:16]}.ply"), time.time()))
+        self._db.commit()
+        return dict(self.job(cursor.lastrowid), deduplicated=False)
+
+    def _jobs_by_key(self, key):
+        return [self._row(r) for r in self._db.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE key = ? ORDER BY id", (key,))]
+
+    def cancel(self, job_id):
+        job = self.job(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        if job_id in self._running:
+            # The worker notices at its next progress report and says CANCELLED
+            self._running[job_id][1].set()
+            return job
+        return self._update(job_id, status=CANCELLED, finished=time.time())
+
+    # Scheduling
+
+    def _free(self):
+        running = [self.job(job_id) for job_id in self._running]
+        return (self.cores - sum(j["cores"] for j in running),
+                self.memory_gb - sum(j["memory_gb"] for j in running))
+
+    def _start_ready(self):
+        # Strict priority order: a big job at the head waits for room rather
+        # than being overtaken indefinitely by smaller ones behind it
+        free_cores, free_memory = self._free()
+        for job in self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE status = ? "
+                                    "ORDER BY priority DESC, id", (PENDING,)).fetchall():
+            job = self._row(job)
+            if job["cores"] > free_cores or job["memory_gb"] > free_memory:
+                break
+            cancel_event = self._context.Event()
+            process = self._context.Process(
+                target=_service_worker, daemon=True,
+                args=(job["cores"], job["id"], job["settings"], job["options"], job["result"],
+                      self._messages, cancel_event))
+            process.start()
+            self._running[job["id"]] = (process, cancel_event)
+            free_cores -= job["cores"]
+            free_memory -= job["memory_gb"]
+            self._update(job["id"], status=RUNNING, started=time.time())
+
+    def _read_messages(self):
+        while True:
+            try:
+                job_id, kind, a, b = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                self._update(job_id, stage=a, fraction=b)
+            elif kind == RUNNING:
+                continue
+            else:
+                self._finish(job_id, kind, error=a if kind == FAILED else None)
+
+    def _drain_messages(self):
+        self._read_messages()
+        dead = [job_id for job_id, (process, _event) in self._running.items() if not process.is_alive()]
+        if not dead:
+            return
+        # A worker may have reported and exited since the queue was read;
+        # its result is flushed before exit, so read again before judging.
+        self._read_messages()
+        for job_id in dead:
+            # A worker that died (e.g. out of memory) never reports back
+            if job_id in self._running and self.job(job_id)["status"] == RUNNING:
+                process, _event = self._running[job_id]
+                self._finish(job_id, FAILED, error=f"Worker exited with code {process.exitcode}")
+
+    def _finish(self, job_id, status, error=None):
+        process, _event = self._running.pop(job_id, (None, None))
+        if process is not None:
+            process.join(timeout=1)
+        self._update(job_id, status=status, error=error, finished=time.time(),
+                     fraction=1.0 if status == DONE else self.job(job_id)["fraction"])
+
+    async def schedule(self):
+        while True:
+            self._drain_messages()
+            self._start_ready()
+            await asyncio.sleep(SCHEDULE_INTERVAL)
+
+    def shutdown(self):
+        # Running jobs are left RUNNING in the database, so they restart with the service
+        for process, _event in self._running.values():
+            process.terminate()
+        for process, _event in self._running.values():
+            process.join(timeout=5)
+        self._running.clear()
+        self._db.close()
+
+    # HTTP
+
+    async def _send(self, writer, status, body, content_type="application/json"):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}[status]
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def _stream_events(self, writer, job_id):
+        # One JSON line per change, ending once the job has finished
+        subscriber = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(subscriber)
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n")
+            job = self.job(job_id)
+            while True:
+                writer.write(json.dumps(job).encode() + b"\n")
+                await writer.drain()
+                if job["status"] in FINISHED:
+                    break
+                job = await subscriber.get()
+        finally:
+            self._subscribers[job_id].discard(subscriber)
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode().split()
+            headers = {}
+            while (line := (await reader.readline()).decode().strip()):
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            if len(request_line) < 2:
+                return
+            method, path = request_line[0], urlparse(request_line[1]).path.rstrip("/")
+
+            match = re.fullmatch(r"/jobs(?:/(\d+))?(?:/(events|result))?", path)
+            if not match:
+                return await self._send(writer, 404, {"error": f"No route {path}"})
+            job_id, sub = (int(match[1]) if match[1] else None), match[2]
+
+            if job_id is None:
+                if method == "GET":
+                    return await self._send(writer, 200, self.jobs())
+                if method != "POST":
+                    return await self._send(writer, 405, {"error": method})
+                request = json.loads(body or b"{}")
+                try:
+                    job = self.submit(request["settings"], request.get("options"),
+                                      priority=request.get("priority", 0), cores=request.get("cores", 1),
+                                      memory_gb=request.get("memory_gb", 1.0))
+                except (KeyError, ValueError) as e:
+                    return await self._send(writer, 400, {"error": str(e)})
+                return await self._send(writer, 200, job)
+
+            if self.job(job_id) is None:
+                return await self._send(writer, 404, {"error": f"No job {job_id}"})
+            if sub == "events":
+                return await self._stream_events(writer, job_id)
+            if sub == "result":
+                job = self.job(job_id)
+                if job["status"] != DONE:
+                    return await self._send(writer, 404, {"error": f"Job {job_id} is {job['status']}"})
+                try:
+                    data = Path(job["result"]).read_bytes()
+                except FileNotFoundError:
+                    # Deleted from the results store; submit() meshes it again
+                    return await self._send(writer, 404, {"error": f"Result of job {job_id} was deleted, "
+                                                                   "submit the settings again"})
+                return await self._send(writer, 200, data, content_type="application/octet-stream")
+            if method == "DELETE":
+                return await self._send(writer, 200, self.cancel(job_id))
+            return await self._send(writer, 200, self.job(job_id))
+        except (ConnectionError, asyncio.IncompleteReadError, json.JSONDecodeError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, unix_socket=None, ready=None):
+        """Serve until cancelled. `ready`, if given, is called with the bound
+        address (useful with port=0)."""
+        if unix_socket:
+            server = await asyncio.start_unix_server(self._handle, path=str(unix_socket))
+            address = str(unix_socket)
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+            address = server.sockets[0].getsockname()[:2]
+        if ready is not None:
+            ready(address)
+        scheduler = asyncio.create_task(self.schedule())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            scheduler.cancel()
+            self.shutdown()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class ServiceClient:
+    """Client for a running GenerationService, e.g. from the preview or a CLI.
+
+    url is http://host:port or unix:///path/to/socket."""
+
+    def __init__(self, url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=None):
+        self.url = urlparse(url)
+        self.timeout = timeout
+
+    def _connection(self):
+        if self.url.scheme == "unix":
+            return _UnixHTTPConnection(self.url.path, timeout=self.timeout)
+        return http.client.HTTPConnection(self.url.hostname, self.url.port or DEFAULT_PORT, timeout=self.timeout)
+
+    def _request(self, method, path, body=None):
+        connection = self._connection()
+        data = json.dumps(body).encode() if body is not None else None
+        connection.request(method, path, body=data, headers={"Content-Type": "application/json"})
+        return connection, connection.getresponse()
+
+    def _json(self, method, path, body=None):
+        connection, response = self._request(method, path, body)
+        try:
+            result = json.loads(response.read())
+            if response.status != 200:
+                raise RuntimeError(result.get("error", response.reason))
+            return result
+        finally:
+            connection.close()
+
+    def submit(self, settings, priority=0, cores=1, memory_gb=1.0, **options):
+        """Queue generate_mesh(settings, **options); returns the job dict."""
+        return self._json("POST", "/jobs", {"settings": settings, "options": options, "priority": priority,
+                                            "cores": cores, "memory_gb": memory_gb})
+
+    def jobs(self):
+        return self._json("GET", "/jobs")
+
+    def job(self, job_id):
+        return self._json("GET", f"/jobs/{job_id}")
+
+    def cancel(self, job_id):
+        return self._json("DELETE", f"/jobs/{job_id}")
+
+    def events(self, job_id):
+        """Yield the job dict on every change until it finishes."""
+        connection, response = self._request("GET", f"/jobs/{job_id}/events")
+        try:
+            while (line := response.readline()):
+                yield json.loads(line)
+        finally:
+            connection.close()
+
+    def download(self, job_id, path):
+        connection, response = self._request("GET", f"/jobs/{job_id}/result")
+        try:
+            data = response.read()
+            if response.status != 200:
+                raise RuntimeError(json.loads(data).get("error", response.reason))
+            Path(path).write_bytes(data)
+            return path
+        finally:
+            connection.close()
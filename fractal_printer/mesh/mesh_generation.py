@@ -1,12 +1,27 @@
 # Helper functions for mesh generation
+from dataclasses import dataclass
 import numpy as np
 import meshio
 from sdf import core as sdf_core
 from sdf.core import _mesh
 import fast_simplification
+from fractal_printer.mesh.mesh_repair import clean_mesh
+from fractal_printer.mesh.mesh_smoothing import TANGENTIAL, smooth_mesh
+from fractal_printer.mesh.mesh_lod import DEFAULT_FRACTIONS, lod_pyramid, write_pyramid
 
 
 
+class GenerationCancelled(Exception):
+    """Raised (typically by a `progress` callback) to abort a generation run."""
+
+
+def _report(progress, stage, fraction=None):
+    # progress(stage, fraction) -- fraction is None while a stage's extent is
+    # unknown. The callback may raise GenerationCancelled to stop the run.
+    if progress is not None:
+        progress(stage, fraction)
+
+
 def simplify_mesh(input_mesh, reduction_factor=0.9, target_count = None, aggression = 2, lossless = False):
     points, faces = fast_simplification.simplify(
         points = input_mesh.points, 
@@ -21,8 +36,50 @@ def box_bounds(size = 2.8):
     return ((-size/2,)*3,(size/2,)*3)
 
 
+def grid_step(bounds, samples):
+    # Spacing of a cubic grid with roughly `samples` points filling `bounds`
+    (x0, y0, z0), (x1, y1, z1) = bounds
+    volume = (x1 - x0) * (y1 - y0) * (z1 - z0)
+    return (volume / samples) ** (1 / 3)
+
 
-def _bisect_edges(sdf, points, origin, step, tol=1e-8, recursion_levels=30, bracket_tol=1e-3, verbose=True):
+@dataclass
+class SampledGrid:
+    """Dense SDF samples: values[i, j, k] is the SDF at origin + (i, j, k) * step."""
+    values: np.ndarray
+    origin: np.ndarray
+    step: float
+
+    def coordinates(self, index):
+        return self.origin + np.asarray(index) * self.step
+
+
+def sample_grid(sdf, samples=2**24, bounds=box_bounds(), slab_points=2**20, progress=None):
+    """Evaluate `sdf` on the full grid generate_bisecting would use for the same
+    `samples`/`bounds`, one slab of x-planes at a time to bound memory."""
+    (x0, y0, z0), (x1, y1, z1) = bounds
+    step = grid_step(bounds, samples)
+    X = np.arange(x0, x1, step)
+    Y = np.arange(y0, y1, step)
+    Z = np.arange(z0, z1, step)
+    values = np.empty((len(X), len(Y), len(Z)), dtype=np.float32)
+
+    yz = np.stack(np.meshgrid(Y, Z, indexing='ij'), axis=-1).reshape(-1, 2)
+    planes = max(1, slab_points // len(yz))
+    for i in range(0, len(X), planes):
+        _report(progress, "sampling", i / len(X))
+        xs = X[i:i + planes]
+        p = np.empty((len(xs) * len(yz), 3))
+        p[:, 0] = np.repeat(xs, len(yz))
+        p[:, 1:] = np.tile(yz, (len(xs), 1))
+        values[i:i + len(xs)] = np.asarray(sdf(p)).reshape(len(xs), len(Y), len(Z))
+    _report(progress, "sampling", 1.0)
+    return SampledGrid(values, np.array([x0, y0, z0], dtype=float), step)
+
+
+
+def _bisect_edges(sdf, points, origin, step, tol=1e-8, recursion_levels=30, bracket_tol=1e-3, verbose=True,
+                  progress=None):
     """Bisect marching-cubes vertices against the SDF, stopping each point as soon as its
     value converges OR its bracket has shrunk well below one grid cell (QUIJIBO-style)."""
     points = np.asarray(points, dtype=float)
@@ -70,6 +127,7 @@ def _bisect_edges(sdf, points, origin, step, tol=1e-8, recursion_levels=30, brac
     result = points.copy()
     spatial_tol = np.min(step) * bracket_tol
     for _ in range(recursion_levels):
+        _report(progress, "bisecting", _ / recursion_levels)
 
         idx = np.where(active)[0]
         if len(idx) == 0:
@@ -104,12 +162,11 @@ def _bisect_edges(sdf, points, origin, step, tol=1e-8, recursion_levels=30, brac
 
 
 def generate_bisecting(sdf, samples=2**24, bounds=box_bounds(), recursion_levels=30,
-                        tol=1e-8, bracket_tol=1e-3, batch_workers=1, verbose=True):
+                        tol=1e-8, bracket_tol=1e-3, batch_workers=1, verbose=True, progress=None):
     if bounds is None:
         bounds = sdf_core._estimate_bounds(sdf)
     (x0, y0, z0), (x1, y1, z1) = bounds
-    volume = (x1 - x0) * (y1 - y0) * (z1 - z0)
-    step = (volume / samples) ** (1 / 3)
+    step = grid_step(bounds, samples)
 
     # step is passed explicitly (rather than samples) so we know the exact grid
     # spacing used, needed to locate each vertex's edge for bisection below.
@@ -118,10 +175,19 @@ def generate_bisecting(sdf, samples=2**24, bounds=box_bounds(), recursion_levels
     # prange across all cores, so an outer ThreadPool here would just contend
     # with that instead of adding anything. Raise it only for a plain,
     # single-threaded sdf where overlapping batches might still help.
+    sampling_sdf = sdf
+    if progress is not None:
+        # sdf.generate has no hooks of its own; reporting from each batch
+        # evaluation is what lets a caller cancel during sampling.
+        def sampling_sdf(p):
+            _report(progress, "sampling")
+            return sdf(p)
+    _report(progress, "sampling", 0.0)
     raw_points = np.asarray(
-        sdf_core.generate(sdf, step=step, bounds=bounds, workers=batch_workers, verbose=verbose),
+        sdf_core.generate(sampling_sdf, step=step, bounds=bounds, workers=batch_workers, verbose=verbose),
         dtype=float,
     )
+    _report(progress, "sampling", 1.0)
 
     # A closed mesh's raw triangle soup repeats each vertex ~6x (once per
     # incident triangle); dedup before bisecting so each distinct edge crossing
@@ -134,35 +200,89 @@ def generate_bisecting(sdf, samples=2**24, bounds=box_bounds(), recursion_levels
         
     if recursion_levels > 0:
         refined = _bisect_edges(sdf, unique_points, origin=(x0, y0, z0), step=step, tol=tol,
-                                recursion_levels=recursion_levels, bracket_tol=bracket_tol, verbose=verbose)
+                                recursion_levels=recursion_levels, bracket_tol=bracket_tol, verbose=verbose,
+                                progress=progress)
+        _report(progress, "bisecting", 1.0)
         return refined[inverse]
     else:
         return unique_points[inverse]
 
 
-def generate_mesh(sdf, samples=2**24, bounds=box_bounds(), recursion_levels=30,
-                             tol=1e-8, bracket_tol=1e-3, batch_workers=1,
-                             simplify=None, save_path=None, verbose=True):
-
+def _build_mesh(sdf, clean, smooth, smooth_method, simplify, verbose, progress, **sampling):
+    # Everything before saving, shared by generate_mesh and generate_mesh_lod.
     # Generate the point list, refining edge crossings against the true SDF
     # instead of trusting marching cubes' linear interpolation between samples.
-    points = generate_bisecting(sdf, samples=samples, bounds=bounds, recursion_levels=recursion_levels,
-                                 tol=tol, bracket_tol=bracket_tol, batch_workers=batch_workers, verbose=verbose)
+    points = generate_bisecting(sdf, verbose=verbose, progress=progress, **sampling)
 
     # Convert to meshio Mesh
+    _report(progress, "converting")
     print("Converting mesh...")
     mesh = _mesh(points)
 
+    # Repair and remove dust islands before the simplifier spends time on them
+    if clean:
+        _report(progress, "cleaning")
+        print("Cleaning mesh...")
+        mesh = clean_mesh(mesh, verbose=verbose)
+
+    # Even out marching-cubes slivers before simplifying, then snap back onto the surface
+    if smooth:
+        _report(progress, "smoothing")
+        print(f"Smoothing mesh ({smooth} {smooth_method} iterations)...")
+        mesh = smooth_mesh(mesh, iterations=smooth, method=smooth_method, sdf=sdf, verbose=verbose)
+
     # Optionally simplify
     if simplify is not None:
+        _report(progress, "simplifying")
         print(f"Simplifying mesh by {simplify}x ...")
         mesh = simplify_mesh(mesh, reduction_factor=simplify)
+    return mesh
+
+
+def generate_mesh(sdf, samples=2**24, bounds=box_bounds(), recursion_levels=30,
+                             tol=1e-8, bracket_tol=1e-3, batch_workers=1,
+                             simplify=None, save_path=None, verbose=True, progress=None,
+                             clean=False, smooth=None, smooth_method=TANGENTIAL):
+    # clean: repair non-manifold geometry and drop dust islands (see
+    # mesh_repair) before smoothing and simplifying.
+    # smooth: optional number of smoothing iterations (see mesh_smoothing),
+    # after which vertices are reprojected onto the SDF surface.
+    # progress: optional callable(stage, fraction) called as each stage
+    # (sampling, bisecting, converting, cleaning, smoothing, simplifying, saving) advances;
+    # raising GenerationCancelled from it aborts the run.
+    mesh = _build_mesh(sdf, clean=clean, smooth=smooth, smooth_method=smooth_method, simplify=simplify,
+                       verbose=verbose, progress=progress, samples=samples, bounds=bounds,
+                       recursion_levels=recursion_levels, tol=tol, bracket_tol=bracket_tol,
+                       batch_workers=batch_workers)
 
     # Optionally save
     if save_path is not None:
+        _report(progress, "saving")
         print(f"Saving mesh to {save_path}...")
         mesh.write(save_path)
 
+    _report(progress, "done", 1.0)
     return mesh
 
 
+def generate_mesh_lod(sdf, fractions=DEFAULT_FRACTIONS, simplify=None, save_path=None, verbose=True, progress=None,
+                      clean=False, smooth=None, smooth_method=TANGENTIAL, **sampling):
+    # generate_mesh followed by a level-of-detail pyramid (see mesh_lod): face
+    # fractions of the full mesh, e.g. (0.1, 0.01), each level simplified from
+    # the one before. Returns the LODLevels, the full mesh first; with
+    # save_path each level is written next to it with an error report.
+    # sampling: samples, bounds, ... as for generate_mesh. progress stages
+    # are generate_mesh's with lod before saving.
+    mesh = _build_mesh(sdf, clean=clean, smooth=smooth, smooth_method=smooth_method, simplify=simplify,
+                       verbose=verbose, progress=progress, **sampling)
+
+    print(f"Building LOD pyramid {tuple(fractions)}...")
+    levels = lod_pyramid(mesh, fractions=fractions, progress=progress, verbose=verbose)
+
+    if save_path is not None:
+        _report(progress, "saving")
+        print(f"Saving mesh and LOD levels to {save_path}...")
+        write_pyramid(levels, save_path)
+
+    _report(progress, "done", 1.0)
+    return levels
@@ -0,0 +1,251 @@
+# Level-of-detail pyramids: a full mesh for printing plus lighter ones for
+# slicer layout and web previews, from one run. Each level is simplified from
+# the previous one rather than from the full mesh, so the whole pyramid costs
+# little more than the first simplification.
+#
+# Every level gets an error report against the base mesh: symmetric
+# point-to-surface distances (base vertices to the level, level vertices to
+# the base), found with a uniform grid of triangle buckets built by counting
+# sort as in mesh_repair.
+import json
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+import meshio
+from numba import njit, prange
+import fast_simplification
+
+from fractal_printer.mesh.mesh_repair import _as_arrays
+
+# Faces kept at each level relative to the base mesh: slicer layout, viewer
+DEFAULT_FRACTIONS = (0.1, 0.01)
+
+# Cap on the grid used to look up triangles, in cells
+_MAX_CELLS = 2**24
+
+
+@dataclass
+class LODLevel:
+    mesh: meshio.Mesh
+    fraction: float             # faces kept relative to the base mesh
+    faces: int
+    max_error: float = 0.0      # symmetric Hausdorff distance to the base mesh, in units
+    mean_error: float = 0.0
+    rms_error: float = 0.0
+    path: str = None
+
+    def report(self):
+        return {"fraction": self.fraction, "faces": self.faces, "vertices": len(self.mesh.points),
+                "max_error": self.max_error, "mean_error": self.mean_error, "rms_error": self.rms_error,
+                "path": self.path}
+
+
+@njit(inline='always')
+def _triangle_distance2(px, py, pz, points, faces, f):
+    # Squared distance from p to triangle f (closest point by Voronoi region,
+    # as in Ericson's Real-Time Collision Detection, 5.1.5)
+    a = points[faces[f, 0]]; b = points[faces[f, 1]]; c = points[faces[f, 2]]
+    abx = b[0] - a[0]; aby = b[1] - a[1]; abz = b[2] - a[2]
+    acx = c[0] - a[0]; acy = c[1] - a[1]; acz = c[2] - a[2]
+    apx = px - a[0]; apy = py - a[1]; apz = pz - a[2]
+    d1 = abx * apx + aby * apy + abz * apz
+    d2 = acx * apx + acy * apy + acz * apz
+    if d1 <= 0 and d2 <= 0:
+        qx, qy, qz = a[0], a[1], a[2]
+    else:
+        bpx = px - b[0]; bpy = py - b[1]; bpz = pz - b[2]
+        d3 = abx * bpx + aby * bpy + abz * bpz
+        d4 = acx * bpx + acy * bpy + acz * bpz
+        cpx = px - c[0]; cpy = py - c[1]; cpz = pz - c[2]
+        d5 = abx * cpx + aby * cpy + abz * cpz
+        d6 = acx * cpx + acy * cpy + acz * cpz
+        vc = d1 * d4 - d3 * d2
+        vb = d5 * d2 - d1 * d6
+        va = d3 * d6 - d5 * d4
+        if d3 >= 0 and d4 <= d3:
+            qx, qy, qz = b[0], b[1], b[2]
+        elif d6 >= 0 and d5 <= d6:
+            qx, qy, qz = c[0], c[1], c[2]
+        elif vc <= 0 and d1 >= 0 and d3 <= 0:
+            t = d1 / (d1 - d3)
+            qx, qy, qz = a[0] + t * abx, a[1] + t * aby, a[2] + t * abz
+        elif vb <= 0 and d2 >= 0 and d6 <= 0:
+            t = d2 / (d2 - d6)
+            qx, qy, qz = a[0] + t * acx, a[1] + t * acy, a[2] + t * acz
+        elif va <= 0 and d4 - d3 >= 0 and d5 - d6 >= 0:
+            t = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+            qx, qy, qz = b[0] + t * (c[0] - b[0]), b[1] + t * (c[1] - b[1]), b[2] + t * (c[2] - b[2])
+        else:
+            total = va + vb + vc
+            if total <= 0:
+                # Degenerate triangle: its nearest vertex will do
+                return min((px - a[0]) ** 2 + (py - a[1]) ** 2 + (pz - a[2]) ** 2,
+                           min(bpx ** 2 + bpy ** 2 + bpz ** 2, cpx ** 2 + cpy ** 2 + cpz ** 2))
+            v = vb / total
+            w = vc / total
+            qx = a[0] + v * abx + w * acx
+            qy = a[1] + v * aby + w * acy
+            qz = a[2] + v * abz + w * acz
+    return (px - qx) ** 2 + (py - qy) ** 2 + (pz - qz) ** 2
+
+
+@njit(inline='always')
+def _cell(x, origin, cell, n):
+    return min(max(int((x - origin) / cell), 0), n - 1)
+
+
+@njit(cache=True)
+def _face_cells(points, faces, origin, cell, dims):
+    # Range of grid cells overlapped by each triangle's bounding box
+    ranges = np.empty((faces.shape[0], 2, 3), dtype=np.int64)
+    for f in range(faces.shape[0]):
+        for ax in range(3):
+            a = points[faces[f, 0], ax]; b = points[faces[f, 1], ax]; c = points[faces[f, 2], ax]
+            ranges[f, 0, ax] = _cell(min(a, min(b, c)), origin[ax], cell, dims[ax])
+            ranges[f, 1, ax] = _cell(max(a, max(b, c)), origin[ax], cell, dims[ax])
+    return ranges
+
+
+@njit(cache=True)
+def _triangle_cells(ranges, dims):
+    # CSR map grid cell -> triangles whose bounding box overlaps it
+    n_cells = dims[0] * dims[1] * dims[2]
+    offsets = np.zeros(n_cells + 1, dtype=np.int64)
+    for f in range(ranges.shape[0]):
+        for i in range(ranges[f, 0, 0], ranges[f, 1, 0] + 1):
+            for j in range(ranges[f, 0, 1], ranges[f, 1, 1] + 1):
+                for k in range(ranges[f, 0, 2], ranges[f, 1, 2] + 1):
+                    offsets[(i * dims[1] + j) * dims[2] + k + 1] += 1
+    for c in range(n_cells):
+        offsets[c + 1] += offsets[c]
+    fill = offsets[:-1].copy()
+    items = np.empty(offsets[-1], dtype=np.int32)
+    for f in range(ranges.shape[0]):
+        for i in range(ranges[f, 0, 0], ranges[f, 1, 0] + 1):
+            for j in range(ranges[f, 0, 1], ranges[f, 1, 1] + 1):
+                for k in range(ranges[f, 0, 2], ranges[f, 1, 2] + 1):
+                    key = (i * dims[1] + j) * dims[2] + k
+                    items[fill[key]] = f
+                    fill[key] += 1
+    return offsets, items
+
+
+@njit(parallel=True, cache=True)
+def _surface_distances(queries, points, faces, offsets, items, origin, cell, dims, out):
+    # Search shells of cells around each query's cell outwards, stopping once
+    # the nearest triangle so far is closer than the walls of the searched
+    # cube (or the cube covers the grid): nothing outside it can be nearer.
+    for q in prange(queries.shape[0]):
+        px = queries[q, 0]; py = queries[q, 1]; pz = queries[q, 2]
+        ci = _cell(px, origin[0], cell, dims[0])
+        cj = _cell(py, origin[1], cell, dims[1])
+        ck = _cell(pz, origin[2], cell, dims[2])
+        best = np.inf
+        r = 0
+        while True:
+            for i in range(max(ci - r, 0), min(ci + r, dims[0] - 1) + 1):
+                for j in range(max(cj - r, 0), min(cj + r, dims[1] - 1) + 1):
+                    for k in range(max(ck - r, 0), min(ck + r, dims[2] - 1) + 1):
+                        if max(abs(i - ci), max(abs(j - cj), abs(k - ck))) != r:
+                            continue
+                        key = (i * dims[1] + j) * dims[2] + k
+                        for t in range(offsets[key], offsets[key + 1]):
+                            best = min(best, _triangle_distance2(px, py, pz, points, faces, items[t]))
+            wall = np.inf
+            for ax, c in ((0, ci), (1, cj), (2, ck)):
+                x = queries[q, ax] - origin[ax]
+                if c - r > 0:
+                    wall = min(wall, x - (c - r) * cell)
+                if c + r < dims[ax] - 1:
+                    wall = min(wall, (c + r + 1) * cell - x)
+            if best <= wall * wall:
+                break
+            r += 1
+        out[q] = np.sqrt(best)
+
+
+def _triangle_grid(points, faces):
+    # Cells about twice the mean edge length, so each holds a handful of triangles
+    lo = points.min(axis=0)
+    hi = points.max(axis=0)
+    edges = points[faces[:, 1]] - points[faces[:, 0]]
+    cell = 2 * np.sqrt(np.mean(np.einsum("ij,ij->i", edges, edges)))
+    cell = max(cell, float(np.prod(hi - lo + 1e-12) / _MAX_CELLS) ** (1 / 3))
+    dims = np.maximum(np.ceil((hi - lo) / cell).astype(np.int64), 1)
+    offsets, items = _triangle_cells(_face_cells(points, faces, lo, cell, dims), dims)
+    return offsets, items, lo, cell, dims
+
+
+def surface_distances(queries, points, faces, grid=None):
+    """Distance from each query point to the nearest triangle of (points, faces).
+    Pass `grid` from _triangle_grid to reuse it across calls."""
+    queries = np.ascontiguousarray(queries, dtype=np.float64)
+    if grid is None:
+        grid = _triangle_grid(points, faces)
+    out = np.empty(len(queries))
+    _surface_distances(queries, points, faces, *grid, out)
+    return out
+
+
+def _sample(points, max_samples, rng):
+    if len(points) <= max_samples:
+        return points
+    return points[rng.choice(len(points), max_samples, replace=False)]
+
+
+def lod_pyramid(input_mesh, fractions=DEFAULT_FRACTIONS, aggression=7, max_samples=2**18, seed=0,
+                progress=None, verbose=True):
+    """Simplify `input_mesh` to each of `fractions` (faces kept relative to it,
+    decreasing), each level from the one before, and measure each level's
+    distance to the base mesh on up to `max_samples` vertices per direction.
+    aggression is fast_simplification's default rather than simplify_mesh's
+    2, which stops well short of small targets.
+
+    Returns LODLevels, the base mesh first."""
+    fractions = sorted(fractions, reverse=True)
+    if not all(0 < f < 1 for f in fractions):
+        raise ValueError(f"LOD fractions must be between 0 and 1, got {fractions}")
+    base_points, base_faces = _as_arrays(input_mesh)
+    rng = np.random.default_rng(seed)
+    base_samples = _sample(base_points, max_samples, rng)
+    base_grid = _triangle_grid(base_points, base_faces)
+    levels = [LODLevel(input_mesh, 1.0, len(base_faces))]
+
+    points, faces = base_points, base_faces
+    for n, fraction in enumerate(fractions):
+        if progress is not None:
+            progress("lod", n / len(fractions))
+        target = max(int(round(fraction * len(base_faces))), 1)
+        points, faces = fast_simplification.simplify(points, faces, target_reduction=1 - target / len(faces),
+                                                     agg=aggression)
+        points = np.ascontiguousarray(points, dtype=np.float64)
+        faces = np.ascontiguousarray(faces, dtype=np.int64)
+
+        errors = np.concatenate([surface_distances(base_samples, points, faces),
+                                 surface_distances(_sample(points, max_samples, rng), base_points, base_faces,
+                                                   base_grid)])
+        level = LODLevel(meshio.Mesh(points, cells={"triangle": faces}), fraction, len(faces),
+                         float(errors.max()), float(errors.mean()), float(np.sqrt(np.mean(errors ** 2))))
+        levels.append(level)
+        if verbose:
+            print(f"  LOD {n + 1}: {level.faces} faces ({level.faces / len(base_faces):.2%}), "
+                  f"error max {level.max_error:.3g}, mean {level.mean_error:.3g}, rms {level.rms_error:.3g}")
+    if progress is not None:
+        progress("lod", 1.0)
+    return levels
+
+
+def write_pyramid(levels, save_path):
+    """Write the base level to `save_path`, level n to `<stem>_lod<n><suffix>`,
+    and the shared metadata and error report to `<stem>_lod.json`."""
+    save_path = Path(save_path)
+    for n, level in enumerate(levels):
+        path = save_path if n == 0 else save_path.with_name(f"{save_path.stem}_lod{n}{save_path.suffix}")
+        level.mesh.write(path)
+        level.path = path.name
+    manifest = save_path.with_name(f"{save_path.stem}_lod.json")
+    points = levels[0].mesh.points
+    with open(manifest, "w") as f:
+        json.dump({"bounds": [points.min(axis=0).tolist(), points.max(axis=0).tolist()],
+                   "levels": [level.report() for level in levels]}, f, indent=4)
+    return manifest
@@ -0,0 +1,286 @@
+# Post-processing for generated meshes: manifold repair and removal of the
+# small disconnected islands ("dust") that form near the fractal boundary.
+#
+# Everything here works on the indexed (points, faces) arrays and is linear in
+# the number of faces: adjacency is built by counting sort into CSR arrays
+# rather than by sorting edge keys, so it keeps scaling at 100M+ triangles.
+import numpy as np
+import meshio
+from numba import njit, prange
+
+
+@njit(cache=True)
+def _vertex_faces(faces, n_vertices):
+    # CSR map vertex -> incident faces
+    offsets = np.zeros(n_vertices + 1, dtype=np.int64)
+    for f in range(faces.shape[0]):
+        for c in range(3):
+            offsets[faces[f, c] + 1] += 1
+    for v in range(n_vertices):
+        offsets[v + 1] += offsets[v]
+    fill = offsets[:-1].copy()
+    incident = np.empty(offsets[-1], dtype=np.int64)
+    for f in range(faces.shape[0]):
+        for c in range(3):
+            v = faces[f, c]
+            incident[fill[v]] = f
+            fill[v] += 1
+    return offsets, incident
+
+
+@njit(cache=True)
+def _edges_by_min_vertex(faces, n_vertices):
+    # CSR map a -> b for every face edge (a, b) with a < b, one entry per face
+    # using it, so an edge's face count is the multiplicity of b in a's bucket.
+    offsets = np.zeros(n_vertices + 1, dtype=np.int64)
+    for f in range(faces.shape[0]):
+        for c in range(3):
+            a = faces[f, c]
+            b = faces[f, (c + 1) % 3]
+            offsets[min(a, b) + 1] += 1
+    for v in range(n_vertices):
+        offsets[v + 1] += offsets[v]
+    fill = offsets[:-1].copy()
+    other = np.empty(offsets[-1], dtype=np.int64)
+    for f in range(faces.shape[0]):
+        for c in range(3):
+            a = faces[f, c]
+            b = faces[f, (c + 1) % 3]
+            lo = min(a, b)
+            other[fill[lo]] = max(a, b)
+            fill[lo] += 1
+    return offsets, other
+
+
+@njit(inline='always')
+def _edge_count(edge_offsets, edge_other, a, b):
+    # Cast first: a prange index is unsigned, and min(uint64, int64) is a float
+    lo = min(np.int64(a), np.int64(b))
+    hi = max(np.int64(a), np.int64(b))
+    n = 0
+    for i in range(edge_offsets[lo], edge_offsets[lo + 1]):
+        if edge_other[i] == hi:
+            n += 1
+    return n
+
+
+@njit(inline='always')
+def _same_orientation(faces, f, g):
+    # True if g's vertex order is a cyclic rotation of f's
+    for r in range(3):
+        if (faces[g, r] == faces[f, 0] and faces[g, (r + 1) % 3] == faces[f, 1]
+                and faces[g, (r + 2) % 3] == faces[f, 2]):
+            return True
+    return False
+
+
+@njit(parallel=True, cache=True)
+def _duplicate_faces(faces, vf_offsets, vf_incident):
+    # A face repeated with opposite winding is a zero-thickness fin: drop every
+    # copy. Repeats with the same winding keep only their first occurrence.
+    remove = np.zeros(faces.shape[0], dtype=np.bool_)
+    for f in prange(faces.shape[0]):
+        a = faces[f, 0]; b = faces[f, 1]; c = faces[f, 2]
+        m = min(a, min(b, c))
+        for i in range(vf_offsets[m], vf_offsets[m + 1]):
+            g = vf_incident[i]
+            if g == f:
+                continue
+            ga = faces[g, 0]; gb = faces[g, 1]; gc = faces[g, 2]
+            if ((ga == a or ga == b or ga == c) and (gb == a or gb == b or gb == c)
+                    and (gc == a or gc == b or gc == c)):
+                if not _same_orientation(faces, f, g) or g < f:
+                    remove[f] = True
+    return remove
+
+
+@njit(cache=True)
+def _find(parent, i):
+    # Union-find root lookup with path halving
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+@njit(inline='always')
+def _fan_groups(v, faces, vf_offsets, vf_incident, edge_offsets, edge_other, parent):
+    # Group the faces around v into fans joined across manifold edges (exactly
+    # two faces). A manifold vertex has one fan; each extra fan is another
+    # sheet touching v (or an edge shared by more than two faces).
+    start = vf_offsets[v]
+    k = vf_offsets[v + 1] - start
+    for i in range(k):
+        parent[i] = i
+    for i in range(k):
+        fi = vf_incident[start + i]
+        for j in range(i + 1, k):
+            fj = vf_incident[start + j]
+            for ci in range(3):
+                w = faces[fi, ci]
+                if w == v:
+                    continue
+                if ((faces[fj, 0] == w or faces[fj, 1] == w or faces[fj, 2] == w)
+                        and _edge_count(edge_offsets, edge_other, v, w) == 2):
+                    ri = _find(parent, i)
+                    rj = _find(parent, j)
+                    if ri != rj:
+                        parent[max(ri, rj)] = min(ri, rj)
+    n_groups = 0
+    for i in range(k):
+        if _find(parent, i) == i:
+            n_groups += 1
+    return n_groups
+
+
+@njit(parallel=True, cache=True)
+def _count_fans(faces, vf_offsets, vf_incident, edge_offsets, edge_other):
+    n_vertices = vf_offsets.shape[0] - 1
+    groups = np.zeros(n_vertices, dtype=np.int64)
+    for v in prange(n_vertices):
+        k = vf_offsets[v + 1] - vf_offsets[v]
+        if k == 0:
+            continue
+        parent = np.empty(k, dtype=np.int64)
+        groups[v] = _fan_groups(v, faces, vf_offsets, vf_incident, edge_offsets, edge_other, parent)
+    return groups
+
+
+@njit(parallel=True, cache=True)
+def _split_fans(faces, vf_offsets, vf_incident, edge_offsets, edge_other, groups, first_new, new_faces):
+    # Give every fan after the first its own copy of the vertex. Each (face,
+    # corner) belongs to exactly one vertex, so the writes never collide.
+    n_vertices = vf_offsets.shape[0] - 1
+    for v in prange(n_vertices):
+        if groups[v] < 2:
+            continue
+        start = vf_offsets[v]
+        k = vf_offsets[v + 1] - start
+        parent = np.empty(k, dtype=np.int64)
+        _fan_groups(v, faces, vf_offsets, vf_incident, edge_offsets, edge_other, parent)
+        # Number the fans by their root's position; fan 0 keeps v itself
+        fan_id = np.full(k, -1, dtype=np.int64)
+        n = 0
+        for i in range(k):
+            if _find(parent, i) == i:
+                fan_id[i] = n
+                n += 1
+        for i in range(k):
+            g = fan_id[_find(parent, i)]
+            if g == 0:
+                continue
+            f = vf_incident[start + i]
+            for c in range(3):
+                if faces[f, c] == v:
+                    new_faces[f, c] = first_new[v] + g - 1
+
+
+@njit(cache=True)
+def _label_components(faces, n_vertices):
+    # Union-find over vertices, joined along face edges
+    parent = np.arange(n_vertices)
+    for f in range(faces.shape[0]):
+        r0 = _find(parent, faces[f, 0])
+        for c in range(1, 3):
+            r = _find(parent, faces[f, c])
+            if r != r0:
+                if r < r0:
+                    parent[r0] = r
+                    r0 = r
+                else:
+                    parent[r] = r0
+    labels = np.empty(n_vertices, dtype=np.int64)
+    for v in range(n_vertices):
+        labels[v] = _find(parent, v)
+    return labels
+
+
+@njit(cache=True)
+def _component_stats(points, faces, labels):
+    # Triangle count and signed enclosed volume (divergence theorem), per root
+    n = labels.shape[0]
+    triangles = np.zeros(n, dtype=np.int64)
+    volume = np.zeros(n, dtype=np.float64)
+    for f in range(faces.shape[0]):
+        a = faces[f, 0]; b = faces[f, 1]; c = faces[f, 2]
+        root = labels[a]
+        triangles[root] += 1
+        volume[root] += (
+            points[a, 0] * (points[b, 1] * points[c, 2] - points[b, 2] * points[c, 1])
+            - points[a, 1] * (points[b, 0] * points[c, 2] - points[b, 2] * points[c, 0])
+            + points[a, 2] * (points[b, 0] * points[c, 1] - points[b, 1] * points[c, 0])
+        ) / 6.0
+    return triangles, volume
+
+
+def _compact(points, faces):
+    # Drop unreferenced vertices and renumber the faces to match
+    used = np.zeros(len(points), dtype=bool)
+    used[faces.ravel()] = True
+    remap = np.cumsum(used) - 1
+    return points[used], remap[faces]
+
+
+def _as_arrays(mesh):
+    points = np.ascontiguousarray(mesh.points, dtype=np.float64)
+    faces = np.ascontiguousarray(mesh.cells[0].data, dtype=np.int64)
+    return points, faces
+
+
+def repair_manifold(points, faces, verbose=True):
+    """Remove degenerate and duplicated faces, then split non-manifold vertices
+    and edges (where bisected vertices collapsed onto each other) by giving
+    each separate fan of faces its own copy of the shared vertex."""
+    degenerate = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 0] == faces[:, 2])
+    faces = faces[~degenerate]
+
+    vf_offsets, vf_incident = _vertex_faces(faces, len(points))
+    duplicate = _duplicate_faces(faces, vf_offsets, vf_incident)
+    if duplicate.any():
+        faces = np.ascontiguousarray(faces[~duplicate])
+        vf_offsets, vf_incident = _vertex_faces(faces, len(points))
+
+    edge_offsets, edge_other = _edges_by_min_vertex(faces, len(points))
+    groups = _count_fans(faces, vf_offsets, vf_incident, edge_offsets, edge_other)
+    extra = np.maximum(groups - 1, 0)
+    n_split = int(np.count_nonzero(extra))
+    if n_split:
+        first_new = len(points) + np.cumsum(extra) - extra
+        new_faces = faces.copy()
+        _split_fans(faces, vf_offsets, vf_incident, edge_offsets, edge_other, groups, first_new, new_faces)
+        points = np.concatenate([points, np.repeat(points, extra, axis=0)])
+        faces = new_faces
+
+    if verbose:
+        print(f'  Removed {int(degenerate.sum())} degenerate and {int(duplicate.sum())} duplicate faces, '
+              f'split {n_split} non-manifold vertices')
+    return points, faces
+
+
+def remove_small_components(points, faces, min_triangles=100, min_volume_fraction=1e-3, verbose=True):
+    """Drop connected components with fewer than `min_triangles` triangles or an
+    enclosed volume below `min_volume_fraction` of the largest component's."""
+    labels = _label_components(faces, len(points))
+    triangles, volume = _component_stats(points, faces, labels)
+    volume = np.abs(volume)
+    is_component = triangles > 0
+    keep_root = is_component & (triangles >= min_triangles)
+    if is_component.any():
+        keep_root &= volume >= min_volume_fraction * volume[is_component].max()
+
+    keep_face = keep_root[labels[faces[:, 0]]]
+    if verbose:
+        n_components = int(is_component.sum())
+        print(f'  Kept {int(keep_root.sum())} of {n_components} components '
+              f'({int(keep_face.sum())} of {len(faces)} triangles)')
+    return _compact(points, faces[keep_face])
+
+
+def clean_mesh(input_mesh, min_triangles=100, min_volume_fraction=1e-3, verbose=True):
+    """Repair non-manifold geometry and remove dust islands, ahead of
+    simplification and slicing."""
+    points, faces = _as_arrays(input_mesh)
+    points, faces = repair_manifold(points, faces, verbose=verbose)
+    points, faces = remove_small_components(points, faces, min_triangles=min_triangles,
+                                            min_volume_fraction=min_volume_fraction, verbose=verbose)
+    return meshio.Mesh(points, cells={"triangle": faces})
@@ -0,0 +1,194 @@
+# Smoothing for generated meshes: Taubin (shrink-free Laplacian) smoothing and
+# tangential relaxation, which evens out the marching-cubes slivers without
+# moving vertices off the surface.
+#
+# The vertex adjacency is built once, by counting sort into CSR arrays (as in
+# mesh_repair), and every iteration is a prange over vertices reading from one
+# buffer and writing the other, so each is linear in the vertex count.
+import numpy as np
+import meshio
+from numba import njit, prange
+
+from fractal_printer.mesh.mesh_repair import _as_arrays, _vertex_faces
+
+TAUBIN, TANGENTIAL = "taubin", "tangential"
+
+
+@njit(parallel=True, cache=True)
+def _vertex_neighbours(faces, n_vertices):
+    # CSR map vertex -> distinct neighbouring vertices, plus the number of
+    # faces at each vertex. Both directions of every face edge go into the
+    # buckets; each edge shows up twice (once per face), so rows are deduped.
+    offsets = np.zeros(n_vertices + 1, dtype=np.int64)
+    for f in range(faces.shape[0]):
+        for c in range(3):
+            offsets[faces[f, c] + 1] += 2
+    for v in range(n_vertices):
+        offsets[v + 1] += offsets[v]
+    fill = offsets[:-1].copy()
+    other = np.empty(offsets[-1], dtype=np.int64)
+    for f in range(faces.shape[0]):
+        for c in range(3):
+            a = faces[f, c]
+            b = faces[f, (c + 1) % 3]
+            other[fill[a]] = b
+            fill[a] += 1
+            other[fill[b]] = a
+            fill[b] += 1
+
+    n_faces = np.empty(n_vertices, dtype=np.int64)
+    counts = np.zeros(n_vertices + 1, dtype=np.int64)
+    for v in prange(n_vertices):
+        lo = offsets[v]
+        hi = offsets[v + 1]
+        n_faces[v] = (hi - lo) // 2
+        # Insertion sort: rows are ~12 entries
+        for i in range(lo + 1, hi):
+            x = other[i]
+            j = i - 1
+            while j >= lo and other[j] > x:
+                other[j + 1] = other[j]
+                j -= 1
+            other[j + 1] = x
+        k = 0
+        for i in range(lo, hi):
+            if i == lo or other[i] != other[i - 1]:
+                other[lo + k] = other[i]
+                k += 1
+        counts[v + 1] = k
+
+    for v in range(n_vertices):
+        counts[v + 1] += counts[v]
+    neighbours = np.empty(counts[-1], dtype=np.int64)
+    for v in prange(n_vertices):
+        lo = offsets[v]
+        for i in range(counts[v + 1] - counts[v]):
+            neighbours[counts[v] + i] = other[lo + i]
+    return counts, neighbours, n_faces
+
+
+@njit(parallel=True, cache=True)
+def _vertex_normals(points, faces, vf_offsets, vf_incident):
+    # Area-weighted vertex normals, gathered per vertex so no writes collide
+    n_vertices = vf_offsets.shape[0] - 1
+    normals = np.zeros((n_vertices, 3))
+    for v in prange(n_vertices):
+        nx = 0.0; ny = 0.0; nz = 0.0
+        for i in range(vf_offsets[v], vf_offsets[v + 1]):
+            f = vf_incident[i]
+            a = faces[f, 0]; b = faces[f, 1]; c = faces[f, 2]
+            ux = points[b, 0] - points[a, 0]; uy = points[b, 1] - points[a, 1]; uz = points[b, 2] - points[a, 2]
+            wx = points[c, 0] - points[a, 0]; wy = points[c, 1] - points[a, 1]; wz = points[c, 2] - points[a, 2]
+            nx += uy * wz - uz * wy
+            ny += uz * wx - ux * wz
+            nz += ux * wy - uy * wx
+        length = np.sqrt(nx * nx + ny * ny + nz * nz)
+        if length > 0:
+            normals[v, 0] = nx / length; normals[v, 1] = ny / length; normals[v, 2] = nz / length
+    return normals
+
+
+@njit(parallel=True, cache=True)
+def _relax(points, offsets, neighbours, pinned, weight, normals, tangential, out):
+    # One umbrella-operator step: move each vertex `weight` of the way to its
+    # neighbours' centroid, keeping only the tangential part if asked.
+    for v in prange(points.shape[0]):
+        lo = offsets[v]
+        hi = offsets[v + 1]
+        if pinned[v] or hi == lo:
+            out[v, 0] = points[v, 0]; out[v, 1] = points[v, 1]; out[v, 2] = points[v, 2]
+            continue
+        dx = 0.0; dy = 0.0; dz = 0.0
+        for i in range(lo, hi):
+            w = neighbours[i]
+            dx += points[w, 0]; dy += points[w, 1]; dz += points[w, 2]
+        k = hi - lo
+        dx = dx / k - points[v, 0]; dy = dy / k - points[v, 1]; dz = dz / k - points[v, 2]
+        if tangential:
+            d = dx * normals[v, 0] + dy * normals[v, 1] + dz * normals[v, 2]
+            dx -= d * normals[v, 0]; dy -= d * normals[v, 1]; dz -= d * normals[v, 2]
+        out[v, 0] = points[v, 0] + weight * dx
+        out[v, 1] = points[v, 1] + weight * dy
+        out[v, 2] = points[v, 2] + weight * dz
+
+
+def reproject(sdf, points, normals, radius, levels=8):
+    """Move each vertex back onto the SDF zero set by bisecting along its
+    normal within `radius`, in levels + 3 batched SDF calls. Vertices with no
+    sign change within reach stay where they are."""
+    value = np.asarray(sdf(points)).reshape(-1)
+    ahead = points + radius * normals
+    behind = points - radius * normals
+    ahead_value = np.asarray(sdf(ahead)).reshape(-1)
+    behind_value = np.asarray(sdf(behind)).reshape(-1)
+
+    inside = value < 0
+    use_ahead = (ahead_value < 0) != inside
+    use_behind = ~use_ahead & ((behind_value < 0) != inside)
+    found = use_ahead | use_behind
+    far = np.where(use_ahead[:, None], ahead, behind)[found]
+
+    # Bisect between the vertex (inside or outside) and the far end (the other side)
+    neg = np.where(inside[found, None], points[found], far)
+    pos = np.where(inside[found, None], far, points[found])
+    for _ in range(levels):
+        mid = (neg + pos) / 2
+        go_neg = np.asarray(sdf(mid)).reshape(-1) < 0
+        neg[go_neg] = mid[go_neg]
+        pos[~go_neg] = mid[~go_neg]
+
+    result = points.copy()
+    result[found] = (neg + pos) / 2
+    return result, int(found.sum())
+
+
+def smooth_points(points, faces, iterations=10, method=TAUBIN, lam=0.5, mu=-0.53, sdf=None, radius=None,
+                  levels=8, verbose=True):
+    """Smooth the vertices of an indexed triangle mesh and return new points.
+
+    method is TAUBIN (alternating lam / mu Laplacian steps, which smooth
+    without shrinking) or TANGENTIAL (lam steps towards the neighbours'
+    centroid within the tangent plane, which regularises triangle shapes).
+    Open-boundary vertices stay fixed. If `sdf` is given, vertices are then
+    reprojected onto its zero set, searching `radius` (default: the mean edge
+    length) along the vertex normals."""
+    if method not in (TAUBIN, TANGENTIAL):
+        raise ValueError(f"Unknown smoothing method {method!r}, expected {TAUBIN!r} or {TANGENTIAL!r}")
+    points = np.ascontiguousarray(points, dtype=np.float64)
+    faces = np.ascontiguousarray(faces, dtype=np.int64)
+    offsets, neighbours, n_faces = _vertex_neighbours(faces, len(points))
+    # On a manifold mesh an interior vertex has as many neighbours as faces
+    pinned = np.diff(offsets) != n_faces
+    vf_offsets, vf_incident = _vertex_faces(faces, len(points))
+
+    current, scratch = points.copy(), np.empty_like(points)
+    no_normals = np.zeros((1, 3))
+    for _ in range(iterations):
+        if method == TAUBIN:
+            _relax(current, offsets, neighbours, pinned, lam, no_normals, False, scratch)
+            _relax(scratch, offsets, neighbours, pinned, mu, no_normals, False, current)
+        else:
+            normals = _vertex_normals(current, faces, vf_offsets, vf_incident)
+            _relax(current, offsets, neighbours, pinned, lam, normals, True, scratch)
+            current, scratch = scratch, current
+
+    if sdf is not None:
+        if radius is None:
+            a, b = faces[:, 0], faces[:, 1]
+            radius = float(np.linalg.norm(current[a] - current[b], axis=1).mean())
+        normals = _vertex_normals(current, faces, vf_offsets, vf_incident)
+        current, n_projected = reproject(sdf, current, normals, radius, levels=levels)
+        if verbose:
+            print(f'  Reprojected {n_projected} of {len(current)} vertices onto the surface')
+    if verbose:
+        print(f'  {iterations} {method} iterations on {len(points)} vertices ({int(pinned.sum())} pinned)')
+    return current
+
+
+def smooth_mesh(input_mesh, iterations=10, method=TAUBIN, lam=0.5, mu=-0.53, sdf=None, radius=None,
+                levels=8, verbose=True):
+    """smooth_points on a meshio Mesh, keeping its faces."""
+    points, faces = _as_arrays(input_mesh)
+    points = smooth_points(points, faces, iterations=iterations, method=method, lam=lam, mu=mu, sdf=sdf,
+                           radius=radius, levels=levels, verbose=verbose)
+    return meshio.Mesh(points, cells={"triangle": faces})
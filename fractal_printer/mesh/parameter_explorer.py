@@ -0,0 +1,240 @@
+# Headless search over Julia coefficients: draw thousands of random settings,
+# classify each on a very coarse grid in one batched numba pass, score the
+# shapes and keep a ranked shortlist, instead of pressing "Randomize" in the
+# preview until something other than dust or a blob turns up.
+import json
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+from numba import njit, prange
+
+from fractal_printer.mesh.fractal_sdfs import _julia_distance
+from fractal_printer.mesh.mesh_generation import box_bounds
+from fractal_printer.mesh.mesh_repair import _find
+
+# Settings the random draws start from when no base settings are given (as
+# in the preview's defaults)
+BASE_SETTINGS = {"slice": 0.0, "offset": 0.005, "iterations": 10, "bailout": 10000}
+N_COEFFICIENTS = 9
+
+# Same area estimate as estimates._CROFTON, here for voxel faces
+_CROFTON = 1.5
+
+
+@dataclass
+class Candidate:
+    settings: dict
+    score: float
+    fill_fraction: float        # share of the bounds that is solid
+    connected_fraction: float   # share of the solid in the largest component
+    area_volume_ratio: float    # surface area / volume, in 1/units
+    detail: float               # area relative to a ball of the same volume (1 = ball)
+    extent: float               # largest bounding box side of the main component / bounds
+    thin_fraction: float        # share of the solid in walls one voxel thick
+
+
+def random_settings(rng, order=3, base=None):
+    """Random coefficients up to `order`, drawn as the preview's Randomize button does."""
+    settings = dict(BASE_SETTINGS if base is None else base)
+    settings["coefficients"] = [
+        [round(float(x), 3) for x in rng.uniform(-1, 1, 4)] if n <= order else [0, 0, 0, 0]
+        for n in range(N_COEFFICIENTS)
+    ]
+    settings["power"] = order
+    return settings
+
+
+@njit(parallel=True, cache=True)
+def _classify_batch(coeffs, powers, slices, iterations, bailouts, offsets, X, Y, Z, inside):
+    # inside[c, i, j, k] for every candidate at once. The prange runs over
+    # (candidate, x-plane) pairs so a few slow candidates don't serialise.
+    n_x = X.shape[0]
+    for r in prange(coeffs.shape[0] * n_x):
+        c = r // n_x
+        i = r % n_x
+        terms = coeffs[c, :int(powers[c]) + 1]
+        for j in range(Y.shape[0]):
+            for k in range(Z.shape[0]):
+                d = _julia_distance(X[i], Y[j], Z[k], terms, slices[c], powers[c], iterations[c],
+                                    bailouts[c], offsets[c], 0.0, 1.0)
+                inside[c, i, j, k] = d < 0
+
+
+@njit(cache=True)
+def _solid(grid, i, j, k):
+    # Outside the grid counts as empty
+    if i < 0 or j < 0 or k < 0 or i >= grid.shape[0] or j >= grid.shape[1] or k >= grid.shape[2]:
+        return False
+    return grid[i, j, k]
+
+
+@njit(cache=True)
+def _score_grid(grid, out):
+    # out = (solid voxels, largest 6-connected component, boundary faces,
+    #        largest component's bounding box side in voxels, thin voxels)
+    n0, n1, n2 = grid.shape
+    parent = np.arange(n0 * n1 * n2)
+    total = 0
+    faces = 0
+    for i in range(n0):
+        for j in range(n1):
+            for k in range(n2):
+                if not grid[i, j, k]:
+                    continue
+                total += 1
+                v = (i * n1 + j) * n2 + k
+                faces += ((not _solid(grid, i - 1, j, k)) + (not _solid(grid, i + 1, j, k))
+                          + (not _solid(grid, i, j - 1, k)) + (not _solid(grid, i, j + 1, k))
+                          + (not _solid(grid, i, j, k - 1)) + (not _solid(grid, i, j, k + 1)))
+                for w, joined in ((v - n1 * n2, _solid(grid, i - 1, j, k)), (v - n2, _solid(grid, i, j - 1, k)),
+                                  (v - 1, _solid(grid, i, j, k - 1))):
+                    if joined:
+                        a = _find(parent, v)
+                        b = _find(parent, w)
+                        if a != b:
+                            parent[max(a, b)] = min(a, b)
+
+    size = np.zeros(n0 * n1 * n2, dtype=np.int64)
+    largest = -1
+    for i in range(n0):
+        for j in range(n1):
+            for k in range(n2):
+                if grid[i, j, k]:
+                    root = _find(parent, (i * n1 + j) * n2 + k)
+                    size[root] += 1
+                    if largest < 0 or size[root] > size[largest]:
+                        largest = root
+
+    lo = np.array([n0, n1, n2]); hi = np.array([-1, -1, -1])
+    # Thin voxels: solid, but in no fully solid 2x2x2 block, i.e. walls a
+    # single voxel thick. core[i, j, k] marks the block starting at (i, j, k).
+    core = np.zeros((n0, n1, n2), dtype=np.bool_)
+    for i in range(n0):
+        for j in range(n1):
+            for k in range(n2):
+                if not grid[i, j, k]:
+                    continue
+                if _find(parent, (i * n1 + j) * n2 + k) == largest:
+                    lo[0] = min(lo[0], i); lo[1] = min(lo[1], j); lo[2] = min(lo[2], k)
+                    hi[0] = max(hi[0], i); hi[1] = max(hi[1], j); hi[2] = max(hi[2], k)
+                full = True
+                for di in range(2):
+                    for dj in range(2):
+                        for dk in range(2):
+                            if not _solid(grid, i + di, j + dj, k + dk):
+                                full = False
+                core[i, j, k] = full
+    thin = 0
+    for i in range(n0):
+        for j in range(n1):
+            for k in range(n2):
+                if not grid[i, j, k]:
+                    continue
+                covered = False
+                for di in range(2):
+                    for dj in range(2):
+                        for dk in range(2):
+                            if _solid(core, i - di, j - dj, k - dk):
+                                covered = True
+                if not covered:
+                    thin += 1
+
+    out[0] = total
+    out[1] = size[largest] if largest >= 0 else 0
+    out[2] = faces
+    out[3] = max(hi[0] - lo[0], max(hi[1] - lo[1], hi[2] - lo[2])) + 1 if largest >= 0 else 0
+    out[4] = thin
+
+
+@njit(parallel=True, cache=True)
+def _score_batch(inside, out):
+    for c in prange(inside.shape[0]):
+        _score_grid(inside[c], out[c])
+
+
+def score_settings(settings_list, resolution=32, bounds=box_bounds(), min_fill=1e-3, max_fill=0.3):
+    """Score each preview settings dict on a resolution^3 grid over `bounds`.
+
+    The score favours one connected piece (connected_fraction), lots of
+    surface for its volume (log of detail), filling the bounds (extent) and
+    few one-voxel walls (thin_fraction, which halves the score at worst: at
+    this resolution fine detail is thin too). Near-empty sets and blobs
+    (fill_fraction outside [min_fill, max_fill]) score 0."""
+    n = len(settings_list)
+    coeffs = np.zeros((n, N_COEFFICIENTS, 4))
+    for c, settings in enumerate(settings_list):
+        given = np.asarray(settings["coefficients"], dtype=np.float64)[:N_COEFFICIENTS]
+        coeffs[c, :len(given)] = given
+    settings_list = [{**BASE_SETTINGS, **s} for s in settings_list]
+    powers = np.array([s.get("power", 2) for s in settings_list], dtype=np.float64)
+    slices = np.array([s["slice"] for s in settings_list], dtype=np.float64)
+    iterations = np.array([s["iterations"] for s in settings_list], dtype=np.int64)
+    bailouts = np.array([s["bailout"] for s in settings_list], dtype=np.float64)
+    offsets = np.array([s["offset"] for s in settings_list], dtype=np.float64)
+
+    axes = [np.linspace(a, b, resolution) for a, b in zip(bounds[0], bounds[1])]
+    step = np.array([ax[1] - ax[0] for ax in axes])
+    inside = np.empty((n, resolution, resolution, resolution), dtype=np.bool_)
+    # Interior points count as distance 0, as in the preview shader, so any
+    # positive offset makes them solid
+    _classify_batch(coeffs, powers, slices, iterations, bailouts, offsets, *axes, inside)
+    stats = np.zeros((n, 5), dtype=np.int64)
+    _score_batch(inside, stats)
+
+    total, largest, faces, side, thin = stats.T.astype(float)
+    solid = np.maximum(total, 1)
+    volume = total * np.prod(step)
+    area = faces * np.mean(step) ** 2 / _CROFTON
+    with np.errstate(divide="ignore", invalid="ignore"):
+        detail = np.where(total > 0, area / np.cbrt(36 * np.pi * volume ** 2), 0.0)
+    fill = total / resolution ** 3
+    connected = largest / solid
+    extent = side / resolution
+    thin_fraction = thin / solid
+    score = connected * (1 - thin_fraction / 2) * extent * np.log(np.maximum(detail, 1))
+    score[(fill < min_fill) | (fill > max_fill)] = 0.0
+
+    return [
+        Candidate(settings, float(score[c]), float(fill[c]), float(connected[c]),
+                  float(area[c] / volume[c]) if total[c] else 0.0, float(detail[c]), float(extent[c]),
+                  float(thin_fraction[c]))
+        for c, settings in enumerate(settings_list)
+    ]
+
+
+def explore(n_candidates=2000, shortlist=20, order=3, base=None, resolution=32, bounds=box_bounds(),
+            seed=None, verbose=True, **kwargs):
+    """Draw `n_candidates` random settings and return the best `shortlist` of
+    them, highest score first. kwargs go to score_settings."""
+    rng = np.random.default_rng(seed)
+    settings_list = [random_settings(rng, order=order, base=base) for _ in range(n_candidates)]
+    candidates = score_settings(settings_list, resolution=resolution, bounds=bounds, **kwargs)
+    ranked = sorted(candidates, key=lambda c: c.score, reverse=True)[:shortlist]
+    if verbose:
+        usable = sum(c.score > 0 for c in candidates)
+        best = f", best score {ranked[0].score:.3f}" if ranked else ""
+        print(f"{usable} of {n_candidates} candidates usable{best}")
+    return ranked
+
+
+def save_shortlist(candidates, output_dir, prefix="candidate"):
+    """Write each candidate's settings to `<output_dir>/<prefix>_<rank>.json`,
+    in the format the preview copies and cpu_renderer.load_settings reads."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for rank, candidate in enumerate(candidates, 1):
+        path = output_dir / f"{prefix}_{rank:02d}.json"
+        with open(path, "w") as f:
+            json.dump(candidate.settings, f, indent=4)
+        paths.append(path)
+    return paths
+
+
+def queue_shortlist(candidates, queue, output_dir, prefix="candidate", **options):
+    """Submit each candidate to a GenerationQueue, saving meshes as
+    `<output_dir>/<prefix>_<rank>.ply`. options go to generate_mesh."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return [queue.submit(c.settings, output_dir / f"{prefix}_{rank:02d}.ply", **options)
+            for rank, c in enumerate(candidates, 1)]
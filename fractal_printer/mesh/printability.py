@@ -0,0 +1,214 @@
+# Printability checks on a dense SDF sample grid: local wall thickness, thin
+# region detection and hollowing with drain holes.
+#
+# All of it runs on voxels with exact Euclidean distance transforms, instead of
+# ray casting against the final triangle mesh.
+from dataclasses import dataclass
+import numpy as np
+import meshio
+from numba import njit, prange
+from skimage.measure import marching_cubes
+
+from fractal_printer.mesh.mesh_generation import box_bounds, sample_grid
+
+# Stand-in for "infinitely far" in the distance transform (inf breaks the
+# parabola intersection arithmetic)
+_FAR = 1e20
+
+
+@njit(cache=True)
+def _edt_line(f, d, v, z):
+    # 1D squared distance transform of sampled function f (Felzenszwalb &
+    # Huttenlocher): lower envelope of the parabolas (q - p)^2 + f[p].
+    n = f.shape[0]
+    k = 0
+    v[0] = 0
+    z[0] = -_FAR
+    z[1] = _FAR
+    for q in range(1, n):
+        s = ((f[q] + q * q) - (f[v[k]] + v[k] * v[k])) / (2.0 * (q - v[k]))
+        while s <= z[k]:
+            k -= 1
+            s = ((f[q] + q * q) - (f[v[k]] + v[k] * v[k])) / (2.0 * (q - v[k]))
+        k += 1
+        v[k] = q
+        z[k] = s
+        z[k + 1] = _FAR
+    k = 0
+    for q in range(n):
+        while z[k + 1] < q:
+            k += 1
+        d[q] = (q - v[k]) ** 2 + f[v[k]]
+
+
+@njit(parallel=True, cache=True)
+def _edt_axis0(grid):
+    n0, n1, n2 = grid.shape
+    for j in prange(n1):
+        f = np.empty(n0); d = np.empty(n0)
+        v = np.empty(n0, dtype=np.int64); z = np.empty(n0 + 1)
+        for k in range(n2):
+            for i in range(n0):
+                f[i] = grid[i, j, k]
+            _edt_line(f, d, v, z)
+            for i in range(n0):
+                grid[i, j, k] = d[i]
+
+
+@njit(parallel=True, cache=True)
+def _edt_axis1(grid):
+    n0, n1, n2 = grid.shape
+    for i in prange(n0):
+        f = np.empty(n1); d = np.empty(n1)
+        v = np.empty(n1, dtype=np.int64); z = np.empty(n1 + 1)
+        for k in range(n2):
+            for j in range(n1):
+                f[j] = grid[i, j, k]
+            _edt_line(f, d, v, z)
+            for j in range(n1):
+                grid[i, j, k] = d[j]
+
+
+@njit(parallel=True, cache=True)
+def _edt_axis2(grid):
+    n0, n1, n2 = grid.shape
+    for i in prange(n0):
+        f = np.empty(n2); d = np.empty(n2)
+        v = np.empty(n2, dtype=np.int64); z = np.empty(n2 + 1)
+        for j in range(n1):
+            for k in range(n2):
+                f[k] = grid[i, j, k]
+            _edt_line(f, d, v, z)
+            for k in range(n2):
+                grid[i, j, k] = d[k]
+
+
+def distance_transform(features, step=1.0):
+    """Euclidean distance from every voxel to the nearest True voxel of
+    `features`, in world units. Separable, so each axis pass is a prange over
+    independent lines."""
+    grid = np.where(features, 0.0, _FAR)
+    _edt_axis2(grid)
+    _edt_axis1(grid)
+    _edt_axis0(grid)
+    return np.sqrt(grid) * step
+
+
+def _opening(inside, depth, radius, step):
+    # Voxels of `inside` covered by some ball of `radius` that fits entirely
+    # inside: the centres are the voxels at least `radius` deep, dilated by it.
+    centres = depth >= radius
+    if not centres.any():
+        return np.zeros_like(inside)
+    return inside & (distance_transform(centres, step) <= radius)
+
+
+def thickness_map(inside, step, thicknesses):
+    """Local thickness: for each inside voxel, the largest of `thicknesses`
+    whose ball still fits inside the solid while covering the voxel. Voxels
+    not covered even by the smallest get twice their depth instead."""
+    depth = distance_transform(~inside, step)
+    thickness = np.where(inside, 2 * depth, 0.0)
+    for t in sorted(thicknesses):
+        thickness[_opening(inside, depth, t / 2, step)] = t
+    return thickness, depth
+
+
+@dataclass
+class PrintabilityReport:
+    min_thickness: float
+    thickness: np.ndarray   # local thickness per voxel (0 outside)
+    thin: np.ndarray        # inside voxels where no min_thickness ball fits
+    origin: np.ndarray
+    step: float
+
+    @property
+    def thin_fraction(self):
+        inside = self.thickness > 0
+        return float(self.thin.sum() / max(inside.sum(), 1))
+
+    @property
+    def thin_points(self):
+        """World coordinates of the thin voxels, e.g. for plotting."""
+        return self.origin + np.argwhere(self.thin) * self.step
+
+
+def analyze_printability(sdf, min_thickness, samples=2**24, bounds=box_bounds(), levels=8,
+                         grid=None, verbose=True):
+    """Sample `sdf` (or reuse a SampledGrid) and flag walls thinner than
+    `min_thickness`. The thickness map is resolved at `levels` thicknesses up
+    to 4 * min_thickness; anything thicker is reported at that cap."""
+    if grid is None:
+        grid = sample_grid(sdf, samples=samples, bounds=bounds)
+    inside = grid.values < 0
+    if min_thickness < 2 * grid.step and verbose:
+        print(f'  Warning: min_thickness {min_thickness} is under two grid steps ({grid.step:.4g}); '
+              f'increase samples for a meaningful check')
+
+    thicknesses = np.linspace(min_thickness / 2, 4 * min_thickness, levels)
+    thicknesses = np.union1d(thicknesses, [min_thickness])
+    thickness, depth = thickness_map(inside, grid.step, thicknesses)
+    thin = inside & (thickness < min_thickness)
+
+    report = PrintabilityReport(min_thickness, thickness, thin, grid.origin, grid.step)
+    if verbose:
+        print(f'  {report.thin_fraction:.2%} of the solid is thinner than {min_thickness}')
+    return report
+
+
+def _drain_hole_sites(cavity, n_holes, axis, min_separation):
+    # Lowest cavity voxels along `axis`, greedily spread at least
+    # min_separation voxels apart. Slabs are visited bottom up, so usually
+    # only the lowest one is ever looked at.
+    other = tuple(a for a in range(3) if a != axis)
+    sites = np.empty((0, 3), dtype=np.int64)
+    for level in np.flatnonzero(cavity.any(axis=other)):
+        candidates = np.insert(np.argwhere(np.take(cavity, level, axis=axis)), axis, level, axis=1)
+        for site in sites:
+            candidates = candidates[np.linalg.norm(candidates - site, axis=1) >= min_separation]
+        while len(candidates) and len(sites) < n_holes:
+            sites = np.vstack([sites, candidates[:1]])
+            candidates = candidates[np.linalg.norm(candidates - candidates[0], axis=1) >= min_separation]
+        if len(sites) == n_holes:
+            break
+    return list(sites)
+
+
+def hollow(sdf, wall_thickness, samples=2**24, bounds=box_bounds(), n_drain_holes=1,
+           drain_radius=None, axis=2, grid=None, verbose=True):
+    """Mesh a hollowed copy of the solid: a shell `wall_thickness` deep with
+    `n_drain_holes` vertical (along -axis) holes drilled from the lowest points
+    of the cavity out through the shell, so resin can drain."""
+    if grid is None:
+        grid = sample_grid(sdf, samples=samples, bounds=bounds)
+    step = grid.step
+    inside = grid.values < 0
+    depth = distance_transform(~inside, step)
+
+    # Solid where the original is solid and within wall_thickness of its surface
+    shell = np.maximum(grid.values, depth - wall_thickness)
+    cavity = depth > wall_thickness
+    if not cavity.any():
+        if verbose:
+            print('  Solid is nowhere thicker than the wall, nothing to hollow')
+        shell = grid.values
+    elif n_drain_holes:
+        drain_radius = drain_radius if drain_radius is not None else max(wall_thickness, 2 * step)
+        r = drain_radius / step
+        sites = _drain_hole_sites(cavity, n_drain_holes, axis, min_separation=4 * r)
+        index = np.indices(shell.shape, sparse=True)
+        other = [a for a in range(3) if a != axis]
+        outside = np.moveaxis(grid.values >= 0, axis, -1)
+        for site in sites:
+            # Each column of the hole runs from the site down to the first
+            # voxel outside the solid, so parts further below stay intact
+            column = outside[..., :site[axis] + 1]
+            exit_level = np.where(column.any(axis=-1), site[axis] - np.argmax(column[..., ::-1], axis=-1), 0)
+            radial = np.sqrt((index[other[0]] - site[other[0]]) ** 2 + (index[other[1]] - site[other[1]]) ** 2)
+            below = (index[axis] <= site[axis]) & (index[axis] >= np.expand_dims(exit_level, axis))
+            shell = np.maximum(shell, np.where(below, (r - radial) * step, -np.inf))
+        if verbose:
+            print(f'  Hollowed with {wall_thickness} walls and {len(sites)} drain hole(s) of radius {drain_radius}')
+
+    verts, faces, _normals, _values = marching_cubes(shell.astype(np.float32), 0)
+    return meshio.Mesh(grid.origin + verts * step, cells={"triangle": faces})
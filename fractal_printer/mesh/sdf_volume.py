@@ -0,0 +1,225 @@
+# Sparse signed-distance volumes: the SDF stored as a grid of cubic bricks, of
+# which only those the surface passes through are written. It's meant
+# for tools that want a distance field rather than a mesh (offsetting,
+# slicing, lattice infill), without anyone allocating the dense grid.
+#
+# File layout (little-endian):
+#   [0, HEADER_SIZE)   magic, then a JSON header (shape, origin, step, ...)
+#   brick payloads     each brick_size^3 values, zlib-compressed or raw,
+#                      starting on ALIGNMENT boundaries
+#   fill table         int8 per brick: 0 stored, +1 all outside, -1 all inside
+#   brick index        (key, offset, nbytes) per stored brick, sorted by key
+#
+# Everything after the header is read through one np.memmap, so opening a
+# volume costs nothing and a brick read touches only that brick's bytes. With
+# compression=None a brick is a zero-copy view into the mapping.
+import json
+import zlib
+import numpy as np
+
+from fractal_printer.mesh.mesh_generation import SampledGrid, _report, box_bounds, grid_step
+
+MAGIC = b"FPSDFV01"
+HEADER_SIZE = 4096
+ALIGNMENT = 64
+
+OUTSIDE, STORED, INSIDE = 1, 0, -1
+
+INDEX_DTYPE = np.dtype([("key", "<i8"), ("offset", "<u8"), ("nbytes", "<u8")])
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_volume(path, sdf, samples=2**24, bounds=box_bounds(), brick_size=16, band=None,
+                 dtype=np.float32, compression="zlib", level=6, slab_points=2**20, progress=None,
+                 verbose=True):
+    """Sample `sdf` on the grid sample_grid would use and write the bricks the
+    surface passes through to `path`.
+
+    A brick is stored when the sign changes anywhere among its samples plus
+    the next layer of samples in +x, +y and +z, i.e. in any grid cell it
+    owns, so crossings on the seam between two bricks are kept too. Bricks
+    with one sign throughout are only recorded as INSIDE or OUTSIDE: sign,
+    not distance, decides, because a Julia SDF's interior is a small constant
+    ((interior_epsilon - offset) * fudge_factor) rather than a distance.
+
+    Bricks are culled the way sdf.generate culls its batches: a brick whose
+    centre is further from the surface than the radius of its samples is
+    never sampled. Stored values are clamped to [-band, band] (default: two
+    grid steps); dtype may be np.float16 to halve the size (values within
+    ~1e-7 of the surface then round to zero)."""
+    if compression not in ("zlib", None):
+        raise ValueError(f"Unknown compression {compression!r}, expected 'zlib' or None")
+    (x0, y0, z0), (x1, y1, z1) = bounds
+    step = grid_step(bounds, samples)
+    band = 2 * step if band is None else float(band)
+    origin = np.array([x0, y0, z0], dtype=float)
+    shape = tuple(len(np.arange(a, b, step)) for a, b in zip(bounds[0], bounds[1]))
+    bricks = tuple(-(-n // brick_size) for n in shape)
+    dtype = np.dtype(dtype).newbyteorder("<")
+
+    # Voxel offsets within a brick plus its +1 apron, and the radius of the
+    # ball around the brick centre covering them
+    apron = brick_size + 1
+    local = np.stack(np.meshgrid(*[np.arange(apron)] * 3, indexing="ij"), axis=-1).reshape(-1, 3) * step
+    radius = np.sqrt(3) * (brick_size + 1) / 2 * step
+
+    jk = np.stack(np.meshgrid(np.arange(bricks[1]), np.arange(bricks[2]), indexing="ij"), axis=-1).reshape(-1, 2)
+    fill = np.full(bricks, OUTSIDE, dtype=np.int8)
+    index = []
+    per_call = max(1, slab_points // len(local))
+
+    with open(path, "wb") as f:
+        f.write(bytes(HEADER_SIZE))
+        offset = HEADER_SIZE
+        for i in range(bricks[0]):
+            _report(progress, "sampling", i / bricks[0])
+            corners = origin + np.column_stack([np.full(len(jk), i), jk]) * brick_size * step
+            centre_values = np.asarray(sdf(corners + (brick_size - 1) / 2 * step)).reshape(-1)
+            fill[i][(centre_values < -radius).reshape(bricks[1:])] = INSIDE
+            candidates = np.flatnonzero(np.abs(centre_values) <= radius)
+
+            for start in range(0, len(candidates), per_call):
+                batch = candidates[start:start + per_call]
+                p = (corners[batch][:, None, :] + local[None]).reshape(-1, 3)
+                values = np.asarray(sdf(p), dtype=float).reshape(len(batch), apron, apron, apron)
+                for b, v in zip(batch, values):
+                    j, k = jk[b]
+                    if v.min() > 0:
+                        continue
+                    if v.max() < 0:
+                        fill[i, j, k] = INSIDE
+                        continue
+                    v = v[:brick_size, :brick_size, :brick_size]
+                    data = np.clip(v, -band, band).astype(dtype).tobytes()
+                    if compression == "zlib":
+                        data = zlib.compress(data, level)
+                    offset = _align(offset)
+                    f.seek(offset)
+                    f.write(data)
+                    fill[i, j, k] = STORED
+                    key = (i * bricks[1] + j) * bricks[2] + k
+                    index.append((key, offset, len(data)))
+                    offset += len(data)
+
+        fill_offset = _align(offset)
+        f.seek(fill_offset)
+        f.write(fill.tobytes())
+        index_offset = _align(fill_offset + fill.nbytes)
+        f.seek(index_offset)
+        # Bricks are written in key order already
+        f.write(np.array(index, dtype=INDEX_DTYPE).tobytes())
+
+        header = {
+            "shape": shape,
+            "bricks": bricks,
+            "brick_size": brick_size,
+            "origin": origin.tolist(),
+            "step": step,
+            "band": band,
+            "dtype": dtype.str,
+            "compression": compression,
+            "fill_offset": fill_offset,
+            "index_offset": index_offset,
+            "n_stored": len(index),
+        }
+        encoded = json.dumps(header).encode()
+        if len(MAGIC) + 4 + len(encoded) > HEADER_SIZE:
+            raise ValueError("Volume header does not fit in HEADER_SIZE")
+        f.seek(0)
+        f.write(MAGIC + np.uint32(len(encoded)).tobytes() + encoded)
+
+    _report(progress, "sampling", 1.0)
+    if verbose:
+        total = int(np.prod(bricks))
+        print(f"Wrote {len(index)} of {total} bricks ({len(index) / total:.1%}) to {path}")
+    return SDFVolume(path)
+
+
+class SDFVolume:
+    """Random-access reader for volumes written by write_volume.
+
+    Voxel [i, j, k] sits at origin + (i, j, k) * step, as in SampledGrid.
+    Bricks that were not stored read back as +band (outside) or -band
+    (inside)."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        if bytes(self._data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{self.path} is not an SDF volume")
+        n = int(np.frombuffer(self._data, dtype="<u4", count=1, offset=len(MAGIC))[0])
+        header = json.loads(bytes(self._data[len(MAGIC) + 4:len(MAGIC) + 4 + n]))
+
+        self.shape = tuple(header["shape"])
+        self.bricks = tuple(header["bricks"])
+        self.brick_size = header["brick_size"]
+        self.origin = np.array(header["origin"])
+        self.step = header["step"]
+        self.band = header["band"]
+        self.dtype = np.dtype(header["dtype"])
+        self.compression = header["compression"]
+        self.fill = np.frombuffer(self._data, dtype=np.int8, count=int(np.prod(self.bricks)),
+                                  offset=header["fill_offset"]).reshape(self.bricks)
+        self.index = np.frombuffer(self._data, dtype=INDEX_DTYPE, count=header["n_stored"],
+                                   offset=header["index_offset"])
+
+    def __repr__(self):
+        return (f"SDFVolume({self.path!r}, shape={self.shape}, brick_size={self.brick_size}, "
+                f"stored={len(self.index)}/{self.fill.size})")
+
+    def brick(self, i, j, k):
+        """Values of brick (i, j, k), shape (brick_size,) * 3. Bricks on the far
+        faces extend past self.shape; those extra voxels are still samples."""
+        b = self.brick_size
+        state = self.fill[i, j, k]
+        if state != STORED:
+            return np.full((b, b, b), state * self.band, dtype=self.dtype)
+        key = (i * self.bricks[1] + j) * self.bricks[2] + k
+        _key, offset, nbytes = self.index[np.searchsorted(self.index["key"], key)]
+        raw = self._data[offset:offset + nbytes]
+        if self.compression == "zlib":
+            raw = zlib.decompress(raw)
+        return np.frombuffer(raw, dtype=self.dtype).reshape(b, b, b)
+
+    def stored_bricks(self):
+        """Yield ((i, j, k), values) for every stored brick, in file order."""
+        nj, nk = self.bricks[1:]
+        for key in self.index["key"]:
+            i, rest = divmod(int(key), nj * nk)
+            j, k = divmod(rest, nk)
+            yield (i, j, k), self.brick(i, j, k)
+
+    def read(self, start, stop):
+        """Dense values for voxels start <= (i, j, k) < stop, read brick by brick."""
+        start = np.maximum(np.asarray(start, dtype=int), 0)
+        stop = np.minimum(np.asarray(stop, dtype=int), self.shape)
+        out = np.empty(np.maximum(stop - start, 0), dtype=self.dtype)
+        if out.size == 0:
+            return out
+        b = self.brick_size
+        first, last = start // b, (stop - 1) // b
+        for i in range(first[0], last[0] + 1):
+            for j in range(first[1], last[1] + 1):
+                for k in range(first[2], last[2] + 1):
+                    corner = np.array([i, j, k]) * b
+                    lo = np.maximum(start, corner)
+                    hi = np.minimum(stop, corner + b)
+                    out[tuple(slice(l - s, h - s) for l, h, s in zip(lo, hi, start))] = \
+                        self.brick(i, j, k)[tuple(slice(l - c, h - c) for l, h, c in zip(lo, hi, corner))]
+        return out
+
+    def __getitem__(self, key):
+        # Contiguous slices only, e.g. volume[10:20, :, 5:6]
+        key = key if isinstance(key, tuple) else (key,)
+        key = key + (slice(None),) * (3 - len(key))
+        if any(not isinstance(s, slice) or s.step not in (None, 1) for s in key):
+            raise IndexError("SDFVolume supports only contiguous slices")
+        bounds = [s.indices(n)[:2] for s, n in zip(key, self.shape)]
+        return self.read([lo for lo, _ in bounds], [hi for _, hi in bounds])
+
+    def to_grid(self):
+        """Whole volume as a dense SampledGrid (e.g. for analyze_printability)."""
+        return SampledGrid(self.read((0, 0, 0), self.shape).astype(np.float32), self.origin.copy(), self.step)
@@ -151,7 +151,8 @@ class ControlsPanel(QScrollArea):
         self.controls = {
             "slice"      : CoupledBox("Slice"),
             "offset"     : CoupledBox("Offset", min=0.0001, max = 0.01, step = 0.0001, default = 0.005),
-            "iterations" : CoupledBox("Iterations", min=1, max = 20, step = 1, default = 10)
+            "iterations" : CoupledBox("Iterations", min=1, max = 20, step = 1, default = 10),
+            "bailout"    : CoupledBox("Bailout", min=4, max = 100000, step = 1, default = 10000)
         }
 
         for c in self.coeffs:
@@ -174,7 +175,8 @@ class ControlsPanel(QScrollArea):
             if c.enabledbox.isChecked():
                 if power < n:
                     power = n
-                coefficients.append(c.value)
+                # Copy: QuaternionSelector mutates its value list in place
+                coefficients.append(list(c.value))
             else:
                 coefficients.append([0]*4)
 
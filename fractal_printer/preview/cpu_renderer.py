@@ -0,0 +1,265 @@
+# CPU raymarch renderer: a numba port of shaders/raymarch_julia.frag for
+# machines without a GPU (thumbnails, headless previews of queued jobs).
+import json
+from pathlib import Path
+
+import numpy as np
+from numba import njit, prange
+
+from fractal_printer.mesh.fractal_sdfs import _julia_distance
+
+# Same starting camera as ModernGLWidget
+DEFAULT_CAMERA = {'theta': np.pi/8, 'phi': np.pi / 3, 'distance': 3.0}
+
+# The preview shader has no fudge factor or interior epsilon; rendering with
+# these values keeps thumbnails pixel-comparable with the interactive window.
+_FUDGE_FACTOR = 1.0
+_INTERIOR_EPSILON = 0.0
+
+
+# Deliberately not inlined: it is called from ~15 sites below and inlining the
+# whole Julia iteration into each makes compilation take minutes.
+@njit(cache=True)
+def _scene_sdf(x, y, z, coeffs, slice_w, power, iterations, bailout, offset):
+    return _julia_distance(x, y, z, coeffs, slice_w, power, iterations, bailout,
+                           offset, _INTERIOR_EPSILON, _FUDGE_FACTOR)
+
+
+@njit(inline='always')
+def _normalize(x, y, z):
+    n = np.sqrt(x*x + y*y + z*z)
+    if n < 1e-12:
+        return 0.0, 0.0, 0.0
+    return x/n, y/n, z/n
+
+
+@njit(inline='always')
+def _raymarch(ox, oy, oz, dx, dy, dz, max_dist, max_steps,
+              coeffs, slice_w, power, iterations, bailout, offset):
+    # Returns (t, hit point); t < 0 means no hit. As in the shader, the
+    # returned t has already been advanced past the reported hit point.
+    t = 0.0
+    d = 1.0
+    px = ox; py = oy; pz = oz
+    for _ in range(max_steps):
+        if d < 0.001:
+            return t, px, py, pz
+        if t > max_dist:
+            break
+        px = ox + dx*t; py = oy + dy*t; pz = oz + dz*t
+        d = _scene_sdf(px, py, pz, coeffs, slice_w, power, iterations, bailout, offset)
+        t += min(d, np.sqrt(px*px + py*py + pz*pz) * 0.1)
+    return -1.0, px, py, pz
+
+
+@njit(inline='always')
+def _estimate_normal(px, py, pz, coeffs, slice_w, power, iterations, bailout, offset):
+    eps = 0.001
+    nx = (_scene_sdf(px + eps, py, pz, coeffs, slice_w, power, iterations, bailout, offset)
+          - _scene_sdf(px - eps, py, pz, coeffs, slice_w, power, iterations, bailout, offset))
+    ny = (_scene_sdf(px, py + eps, pz, coeffs, slice_w, power, iterations, bailout, offset)
+          - _scene_sdf(px, py - eps, pz, coeffs, slice_w, power, iterations, bailout, offset))
+    nz = (_scene_sdf(px, py, pz + eps, coeffs, slice_w, power, iterations, bailout, offset)
+          - _scene_sdf(px, py, pz - eps, coeffs, slice_w, power, iterations, bailout, offset))
+    return _normalize(nx, ny, nz)
+
+
+@njit(inline='always')
+def _shade_surface(px, py, pz, nx, ny, nz, cx, cy, cz):
+    # Diffuse + two lights + Blinn-Phong specular (shadeSurface in the shader)
+    l1x, l1y, l1z = _normalize(1.0, 2.0, 1.0)
+    l2x, l2y, l2z = _normalize(-1.0, 1.0, 0.5)
+
+    diff1 = max(nx*l1x + ny*l1y + nz*l1z, 0.0)
+    diff2 = max(nx*l2x + ny*l2y + nz*l2z, 0.0)
+    diffuse = diff1 * 0.9 + diff2 * 0.6
+
+    vx, vy, vz = _normalize(cx - px, cy - py, cz - pz)
+    h1x, h1y, h1z = _normalize(l1x + vx, l1y + vy, l1z + vz)
+    h2x, h2y, h2z = _normalize(l2x + vx, l2y + vy, l2z + vz)
+    spec1 = max(nx*h1x + ny*h1y + nz*h1z, 0.0) ** 64.0
+    spec2 = max(nx*h2x + ny*h2y + nz*h2z, 0.0) ** 32.0
+    specular = (spec1 * 0.8 + spec2 * 0.5) * 0.35
+
+    light = 0.12 + diffuse
+    return 1.0*light + specular, 0.8*light + specular, 0.6*light + specular
+
+
+@njit(inline='always')
+def _ambient_occlusion(px, py, pz, nx, ny, nz, coeffs, slice_w, power, iterations, bailout, offset):
+    ao = 0.0
+    sca = 1.0
+    for i in range(1, 6):
+        h = i * 0.02
+        dist = _scene_sdf(px + nx*h, py + ny*h, pz + nz*h,
+                          coeffs, slice_w, power, iterations, bailout, offset)
+        ao += (h - dist) * sca
+        sca *= 0.5
+    return min(max(1.0 - ao, 0.0), 1.0)
+
+
+@njit(parallel=True, cache=True)
+def _render_tiles(coeffs, slice_w, power, iterations, bailout, offset,
+                  cam, forward, right, up, aspect, tile_size, max_steps,
+                  ambient_occlusion, reflections, out):
+    height, width = out.shape[0], out.shape[1]
+    tiles_x = (width + tile_size - 1) // tile_size
+    tiles_y = (height + tile_size - 1) // tile_size
+    cx = cam[0]; cy = cam[1]; cz = cam[2]
+    max_dist = 4.0 * np.sqrt(cx*cx + cy*cy + cz*cz)
+
+    # One tile per task: neighbouring pixels march similar distances, so tiles
+    # balance far better across threads than whole rows do.
+    for tile in prange(tiles_x * tiles_y):
+        row0 = (tile // tiles_x) * tile_size
+        col0 = (tile % tiles_x) * tile_size
+        for row in range(row0, min(row0 + tile_size, height)):
+            for col in range(col0, min(col0 + tile_size, width)):
+                # Pixel centre in GL uv space (origin bottom-left)
+                u = (col + 0.5) / width
+                v = 1.0 - (row + 0.5) / height
+
+                # correct_aspect
+                if aspect > 1:
+                    su = 0.5 + (u - 0.5) * aspect
+                    sv = v
+                else:
+                    su = u
+                    sv = 0.5 + (v - 0.5) / aspect
+
+                # getRayDir (fov = 1)
+                dx, dy, dz = _normalize(
+                    forward[0] + (su - 0.5)*right[0] + (sv - 0.5)*up[0],
+                    forward[1] + (su - 0.5)*right[1] + (sv - 0.5)*up[1],
+                    forward[2] + (su - 0.5)*right[2] + (sv - 0.5)*up[2],
+                )
+
+                t, px, py, pz = _raymarch(cx, cy, cz, dx, dy, dz, max_dist, max_steps,
+                                          coeffs, slice_w, power, iterations, bailout, offset)
+                if t <= 0.0:
+                    out[row, col, 0] = u * 0.1
+                    out[row, col, 1] = v * 0.1
+                    out[row, col, 2] = 0.15
+                    continue
+
+                nx, ny, nz = _estimate_normal(px, py, pz, coeffs, slice_w, power,
+                                              iterations, bailout, offset)
+                lr, lg, lb = _shade_surface(px, py, pz, nx, ny, nz, cx, cy, cz)
+
+                ao = 1.0
+                if ambient_occlusion:
+                    ao = _ambient_occlusion(px, py, pz, nx, ny, nz, coeffs, slice_w, power,
+                                            iterations, bailout, offset)
+
+                vx, vy, vz = _normalize(cx - px, cy - py, cz - pz)
+                ndv = nx*vx + ny*vy + nz*vz
+                if reflections:
+                    # Single-bounce reflection (traceReflection)
+                    rr = 0.02; rg = 0.04; rb = 0.06
+                    ddn = dx*nx + dy*ny + dz*nz
+                    rdx = dx - 2.0*ddn*nx; rdy = dy - 2.0*ddn*ny; rdz = dz - 2.0*ddn*nz
+                    t2, hx, hy, hz = _raymarch(px + rdx*0.01, py + rdy*0.01, pz + rdz*0.01,
+                                               rdx, rdy, rdz, max_dist, max_steps,
+                                               coeffs, slice_w, power, iterations, bailout, offset)
+                    if t2 > 0.0:
+                        n2x, n2y, n2z = _estimate_normal(hx, hy, hz, coeffs, slice_w, power,
+                                                         iterations, bailout, offset)
+                        rr, rg, rb = _shade_surface(hx, hy, hz, n2x, n2y, n2z, cx, cy, cz)
+
+                    fresnel = (1.0 - max(ndv, 0.0)) ** 5.0
+                    k = 0.15 + (0.4 - 0.15) * fresnel
+                    out[row, col, 0] = lr * ao * (1.0 - k) + rr * k
+                    out[row, col, 1] = lg * ao * (1.0 - k) + rg * k
+                    out[row, col, 2] = lb * ao * (1.0 - k) + rb * k
+                else:
+                    out[row, col, 0] = lr * ao
+                    out[row, col, 1] = lg * ao
+                    out[row, col, 2] = lb * ao
+
+
+def _camera_basis(camera):
+    # getCameraPos / getRayDir from the shader, looking at the origin
+    theta, phi, r = camera['theta'], camera['phi'], camera['distance']
+    cam = np.array([
+        r * np.sin(phi) * np.cos(theta),
+        r * np.cos(phi),
+        r * np.sin(phi) * np.sin(theta),
+    ])
+    forward = -cam / np.linalg.norm(cam)
+    right = np.cross([0.0, 1.0, 0.0], forward)
+    right /= np.linalg.norm(right)
+    up = np.cross(forward, right)
+    return cam, forward, right, up
+
+
+def _settings_args(settings):
+    # Only the first power+1 coefficients contribute (the shader loops n <= power)
+    power = int(settings.get("power", 2))
+    coeffs = np.zeros((power + 1, 4), dtype=np.float64)
+    given = np.asarray(settings["coefficients"], dtype=np.float64)[:power + 1]
+    coeffs[:len(given)] = given
+    return (
+        coeffs,
+        float(settings.get("slice", 0.0)),
+        float(power),
+        int(settings.get("iterations", 10)),
+        float(settings.get("bailout", 100000)),
+        float(settings.get("offset", 0.0)),
+    )
+
+
+def render(settings, width=256, height=256, camera=None, tile_size=16, max_steps=5000,
+           ambient_occlusion=True, reflections=True):
+    """Raymarch `settings` (the preview's settings dict) into an (height, width, 3)
+    float image in [0, 1]."""
+    camera = {**DEFAULT_CAMERA, **(camera or {})}
+    cam, forward, right, up = _camera_basis(camera)
+    out = np.zeros((height, width, 3), dtype=np.float64)
+    _render_tiles(*_settings_args(settings), cam, forward, right, up,
+                  width / height, int(tile_size), int(max_steps),
+                  bool(ambient_occlusion), bool(reflections), out)
+    return np.clip(out, 0.0, 1.0)
+
+
+def render_progressive(settings, width=256, height=256, levels=3, **kwargs):
+    """Yield renders of increasing resolution, halving each side per level below
+    the full (width, height), so a caller can show something quickly."""
+    for level in reversed(range(levels)):
+        scale = 2 ** level
+        w, h = max(1, width // scale), max(1, height // scale)
+        yield render(settings, width=w, height=h, **kwargs)
+
+
+def save_png(image, path):
+    import matplotlib.image
+    matplotlib.image.imsave(path, np.clip(image, 0.0, 1.0))
+    return path
+
+
+def load_settings(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def render_batch(settings_paths, output_dir, width=256, height=256, levels=1, verbose=True, **kwargs):
+    """Render each settings file to `<output_dir>/<stem>.png`.
+
+    With levels > 1, the lower resolutions are written first as
+    `<stem>_<w>x<h>.png` so partial previews exist while the rest of the
+    batch is still rendering."""
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for settings_path in settings_paths:
+        settings_path = Path(settings_path)
+        settings = load_settings(settings_path)
+        if verbose:
+            print(f"Rendering {settings_path.name}...")
+        for image in render_progressive(settings, width=width, height=height, levels=levels, **kwargs):
+            h, w = image.shape[:2]
+            if (w, h) == (width, height):
+                path = output_dir / f"{settings_path.stem}.png"
+            else:
+                path = output_dir / f"{settings_path.stem}_{w}x{h}.png"
+            written.append(save_png(image, path))
+    return written
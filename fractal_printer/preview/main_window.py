@@ -1,14 +1,30 @@
 # Main window for the raymarch preview app
-from PyQt6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QFrame, QPushButton, QProgressBar, QLabel
-from PyQt6.QtCore import pyqtSignal
+from PyQt6.QtWidgets import QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QFrame, QPushButton, QProgressBar, QLabel, QCheckBox, QComboBox, QListWidget
+from PyQt6.QtCore import pyqtSignal, QTimer
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
 from fractal_printer.preview.modern_gl_widget import ModernGLWidget
 from fractal_printer.preview.controls_panel import ControlsPanel
+from fractal_printer.preview.update_scheduler import UpdateScheduler
+from fractal_printer.mesh.generation_jobs import GenerationQueue, RUNNING, FAILED
+from fractal_printer.paths import OUTPUT_DIR
+import multiprocessing
 import pyperclip
 import json
 import random
 
 RANDOM_ORDER = 3
 
+# Random settings scored per Explore batch, and how many of the best are kept
+EXPLORE_CANDIDATES = 500
+EXPLORE_SHORTLIST = 10
+
+# Sample counts offered for background mesh generation
+MESH_SAMPLE_OPTIONS = [2**20, 2**22, 2**24, 2**26, 2**28]
+DEFAULT_MESH_SAMPLES = 2**24
+
 DEFAULT_SETTINGS = {
     "coefficients": [
         [-0.381, 0.625, 0.794, 0],
@@ -46,8 +62,16 @@ def _format_settings(settings):
     return "\n".join(lines)
 
 
+def _explore(base):
+    # Runs in the explore worker process, so numba start-up and the scoring
+    # itself stay off the GUI thread
+    from fractal_printer.mesh.parameter_explorer import explore
+    return explore(EXPLORE_CANDIDATES, shortlist=EXPLORE_SHORTLIST, order=RANDOM_ORDER, base=base)
+
+
 class MainWindow(QMainWindow):
     viewportResized = pyqtSignal(int, int)
+    exploreFinished = pyqtSignal(object)   # the finished explore Future
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Quaternionic Julia Preview")
@@ -74,12 +98,63 @@ class MainWindow(QMainWindow):
         layout.addWidget(self.sidebar, stretch=0)
 
         # Shader options
+        # Control changes are coalesced to one renderer update per frame
         self.controls_panel = ControlsPanel()
-        self.controls_panel.controlsChanged.connect(self.gl_widget.updateControls)
-        self.gl_widget.updateControls(self.controls_panel.get_controls())
+        self.update_scheduler = UpdateScheduler(self)
+        self.controls_panel.controlsChanged.connect(self.update_scheduler.submit)
+        self.update_scheduler.changesReady.connect(self.gl_widget.updateControls)
+        self.update_scheduler.submit(self.controls_panel.get_controls())
+        self.update_scheduler.flush()
         self.controls_panel.setMinimumWidth(300)
         sidebar_layout.addWidget(self.controls_panel, stretch=1)
 
+        # Render timing readout
+        timing_layout = QHBoxLayout()
+        self.progressive_box = QCheckBox("Progressive")
+        self.progressive_box.setChecked(self.gl_widget.progressive)
+        self.progressive_box.checkStateChanged.connect(self.on_toggle_progressive)
+        timing_layout.addWidget(self.progressive_box)
+        self.frame_time_label = QLabel("")
+        timing_layout.addWidget(self.frame_time_label, stretch=1)
+        sidebar_layout.addLayout(timing_layout)
+        self.gl_widget.frameTimed.connect(self.on_frame_timed)
+
+        # Background mesh generation: job list, progress and cancel
+        self.generation_box = QFrame()
+        self.generation_box.setFrameShape(QFrame.Shape.StyledPanel)
+        generation_layout = QVBoxLayout()
+        self.generation_box.setLayout(generation_layout)
+        sidebar_layout.addWidget(self.generation_box)
+
+        generate_row = QHBoxLayout()
+        self.generate_btn = QPushButton("Generate Mesh")
+        self.generate_btn.clicked.connect(self.on_generate_mesh)
+        generate_row.addWidget(self.generate_btn)
+        self.samples_box = QComboBox()
+        for samples in MESH_SAMPLE_OPTIONS:
+            self.samples_box.addItem(f"2^{samples.bit_length() - 1} samples", samples)
+        self.samples_box.setCurrentIndex(MESH_SAMPLE_OPTIONS.index(DEFAULT_MESH_SAMPLES))
+        generate_row.addWidget(self.samples_box)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.on_cancel_mesh)
+        generate_row.addWidget(self.cancel_btn)
+        generation_layout.addLayout(generate_row)
+
+        self.progress = QProgressBar()
+        self.progress.setVisible(False)
+        generation_layout.addWidget(self.progress)
+
+        self.job_list = QListWidget()
+        self.job_list.setFixedHeight(80)
+        generation_layout.addWidget(self.job_list)
+
+        # The worker pool is only started on the first Generate click
+        self.generation_queue = None
+        self._job_items = {}
+        self.generation_timer = QTimer(self)
+        self.generation_timer.setInterval(100)
+        self.generation_timer.timeout.connect(self.on_poll_generation)
+
         # Bottom box for mesh generation
         self.bottom_box = QFrame()
         self.bottom_box.setFrameShape(QFrame.Shape.StyledPanel)
@@ -100,10 +175,20 @@ class MainWindow(QMainWindow):
         self.randomize_btn = QPushButton("Randomize")
         self.randomize_btn.setStyleSheet(big_label_style)
         self.randomize_btn.clicked.connect(self.on_randomize_settings)
+        self.explore_btn = QPushButton("Explore")
+        self.explore_btn.setStyleSheet(big_label_style)
+        self.explore_btn.setToolTip("Load the next of the best-scoring random settings")
+        self.explore_btn.clicked.connect(self.on_explore_settings)
+        self._shortlist = []
+        # Explore scores its batch in a worker process, started on first use
+        self._explore_executor = None
+        self._explore_future = None
+        self.exploreFinished.connect(self.on_explore_finished)
 
         self.bottom_layout.addWidget(self.copy_btn)
         self.bottom_layout.addWidget(self.paste_btn)
         self.bottom_layout.addWidget(self.randomize_btn)
+        self.bottom_layout.addWidget(self.explore_btn)
 
         # Put in the default values
         self.controls_panel.set_controls(DEFAULT_SETTINGS)
@@ -120,21 +205,66 @@ class MainWindow(QMainWindow):
             h = self.gl_widget.height()
             self.viewportResized.emit(w, h)
 
+    def on_toggle_progressive(self):
+        self.gl_widget.progressive = self.progressive_box.isChecked()
+        self.gl_widget.restartProgressive()
+
+    def on_frame_timed(self, name, pass_ms, total_ms):
+        self.frame_time_label.setText(f"{name}: {pass_ms:.1f} ms (total {total_ms:.1f} ms)")
+
     def on_generate_mesh(self):
+        if self.generation_queue is None:
+            self.generation_queue = GenerationQueue()
+        settings = self.controls_panel.get_controls()
+        save_path = OUTPUT_DIR / f"mesh_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{len(self._job_items) + 1}.ply"
+        job = self.generation_queue.submit(settings, save_path, samples=self.samples_box.currentData(), clean=True)
+        self.job_list.addItem(self._describe_job(job))
+        self._job_items[job.job_id] = self.job_list.item(self.job_list.count() - 1)
+        self.job_list.setCurrentRow(self.job_list.count() - 1)
         self.progress.setVisible(True)
-        # Here, launch a process to print controls (stub for now)
-        import multiprocessing, time
-        controls = self.controls_panel.get_controls()
-        def dummy_mesh_job(ctrls):
-            print("[Dummy Mesh Process] Controls:", ctrls)
-            time.sleep(2)
-        p = multiprocessing.Process(target=dummy_mesh_job, args=(controls,))
-        p.start()
-        # Simulate done after a delay (in real app, use QProcess or signals)
-        from threading import Timer
-        def finish():
+        self.generation_timer.start()
+
+    def on_cancel_mesh(self):
+        if self.generation_queue is None:
+            return
+        row = self.job_list.currentRow()
+        for job_id, item in self._job_items.items():
+            if self.job_list.row(item) == row:
+                self.generation_queue.cancel(job_id)
+
+    def on_poll_generation(self):
+        for job in self.generation_queue.poll():
+            self._job_items[job.job_id].setText(self._describe_job(job))
+            if job.status == FAILED:
+                print(f"Mesh job {job.job_id} failed:\n{job.error}")
+                self.statusBar().showMessage(f"Mesh job {job.job_id} failed: {job.error.strip().splitlines()[-1]}")
+
+        # The progress bar follows the oldest job still running
+        running = [j for j in self.generation_queue.active() if j.status == RUNNING]
+        if running and running[0].fraction is not None:
+            self.progress.setRange(0, 100)
+            self.progress.setValue(int(running[0].fraction * 100))
+            self.progress.setFormat(f"{running[0].stage} %p%")
+        elif running:
+            self.progress.setRange(0, 0)  # busy indicator for stages of unknown length
+        if not self.generation_queue.active():
             self.progress.setVisible(False)
-        Timer(2.2, finish).start()
+            self.generation_timer.stop()
+
+    @staticmethod
+    def _describe_job(job):
+        name = Path(job.save_path).name
+        if job.status == RUNNING and job.stage:
+            pct = f" {job.fraction:.0%}" if job.fraction is not None else ""
+            return f"#{job.job_id} {name}: {job.stage}{pct}"
+        return f"#{job.job_id} {name}: {job.status}"
+
+    def closeEvent(self, event):
+        if self.generation_queue is not None:
+            self.generation_queue.shutdown()
+        if self._explore_executor is not None:
+            self._explore_executor.shutdown(wait=False, cancel_futures=True)
+        super().closeEvent(event)
 
     def on_copy_settings(self):
         data_string = _format_settings(self.controls_panel.get_controls())
@@ -155,3 +285,45 @@ class MainWindow(QMainWindow):
         ]
         settings["power"] = RANDOM_ORDER
         self.controls_panel.set_controls(settings)
+
+    def on_explore_settings(self):
+        # Score a batch of random settings once, then step through the best
+        if self._shortlist:
+            self._show_candidate(self._shortlist.pop(0))
+            return
+        if self._explore_future is not None:
+            return
+        if self._explore_executor is None:
+            self._explore_executor = ProcessPoolExecutor(max_workers=1,
+                                                         mp_context=multiprocessing.get_context("spawn"))
+        self.explore_btn.setEnabled(False)
+        self.explore_btn.setText("Exploring...")
+        # The callback runs on an executor thread; the signal hands the result
+        # back to the GUI thread
+        self._explore_future = self._explore_executor.submit(_explore, self.controls_panel.get_controls())
+        self._explore_future.add_done_callback(self.exploreFinished.emit)
+
+    def on_explore_finished(self, future):
+        self._explore_future = None
+        self.explore_btn.setEnabled(True)
+        self.explore_btn.setText("Explore")
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            if isinstance(future.exception(), BrokenProcessPool):
+                # The worker died; start a fresh pool on the next click
+                self._explore_executor = None
+            print(f"Explore failed: {future.exception()!r}")
+            self.statusBar().showMessage(f"Explore failed: {future.exception()!r}")
+            return
+        self._shortlist = future.result()
+        if not self._shortlist:
+            self.statusBar().showMessage("Explore found no usable settings, try again")
+            return
+        self._show_candidate(self._shortlist.pop(0))
+
+    def _show_candidate(self, candidate):
+        print(f"Score {candidate.score:.3f} (connected {candidate.connected_fraction:.0%}, "
+              f"thin {candidate.thin_fraction:.0%}, extent {candidate.extent:.2f})")
+        print(_format_settings(candidate.settings))
+        self.controls_panel.set_controls(candidate.settings)
@@ -1,16 +1,56 @@
 # ModernGLWidget: OpenGL rendering widget for raymarching
 from PyQt6.QtOpenGLWidgets import QOpenGLWidget
-from PyQt6.QtCore import pyqtSignal, Qt, QEvent
+from PyQt6.QtCore import pyqtSignal, Qt, QEvent, QTimer
 from PyQt6.QtWidgets import QMessageBox, QPinchGesture
 import moderngl
 import numpy as np
-import os
+from fractal_printer.preview.shader_variants import fragment_shader
+
+# Progressive rendering: while the user is dragging or moving sliders, only a
+# cheap downscaled pass (no AO, no reflections, capped march steps) is drawn.
+# Once input has stopped for REFINE_DELAY_MS, the remaining passes refine a
+# persistent full-resolution framebuffer over the following idle frames, a
+# band of rows per frame so no single frame blocks the event loop for long.
+# Each full-resolution pass starts from the stretched image of the pass before,
+# so rows not yet drawn never show the previous settings.
+LOW_RES_SCALE = 4
+INTERACTIVE_MAX_STEPS = 500
+REFINE_BANDS = 4
+REFINE_DELAY_MS = 150
+
+# (name, scale, enable AO, enable reflection, max steps, bands)
+PROGRESSIVE_PASSES = [
+    ("low-res",  LOW_RES_SCALE, False, False, INTERACTIVE_MAX_STEPS, 1),
+    ("full-res", 1,             False, False, 5000,                  REFINE_BANDS),
+    ("refined",  1,             True,  True,  5000,                  REFINE_BANDS),
+]
+
+VERTEX_SHADER = '''
+#version 330
+in vec2 in_vert;
+out vec2 uv;
+void main() {
+    uv = in_vert * 0.5 + 0.5;
+    gl_Position = vec4(in_vert, 0.0, 1.0);
+}
+'''
+
+BLIT_SHADER = '''
+#version 330
+in vec2 uv;
+out vec4 fragColor;
+uniform sampler2D image;
+void main() {
+    fragColor = texture(image, uv);
+}
+'''
 
 
 class ModernGLWidget(QOpenGLWidget):
     cameraMoved = pyqtSignal(float, float)
     zoomChanged = pyqtSignal(float)
     controlsChanged = pyqtSignal(dict)
+    frameTimed = pyqtSignal(str, float, float)  # pass name, pass ms, ms since last restart
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -18,11 +58,36 @@ class ModernGLWidget(QOpenGLWidget):
         self.prog = None
         self.vbo = None
         self.vao = None
+        self._programs = {}         # power -> (program, vao), see shader_variants
+        self._program_power = None
         self.mouse_pos = (0, 0)
         self.camera = {'theta': np.pi/8, 'phi': np.pi / 3, 'distance': 3.0}
         self.controls = {}
         self._shader_error_shown = False
 
+        # Uniforms keep their values between frames, so only upload what changed
+        self._dirty_uniforms = set()
+        self._uploaded_view = None
+
+        # Progressive rendering state
+        self.progressive = True
+        self.blit_prog = None
+        self.blit_vao = None
+        self._queries = []          # two GPU timer queries, used in turn
+        self._query_index = 0
+        self._pending_timing = None # (query, pass name, progressive) from the last frame
+        self._targets = {}          # scale -> (texture, framebuffer)
+        self._pass_index = 0
+        self._band_index = 0
+        self._elapsed_ms = 0.0
+        self._refine_timer = QTimer(self)
+        self._refine_timer.setSingleShot(True)
+        self._refine_timer.timeout.connect(self.update)
+        # Restarted by every interaction; refinement waits until it fires
+        self._settle_timer = QTimer(self)
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.timeout.connect(self.update)
+
         # Attempt to grab pinch gesture (different enum locations across Qt versions)
         try:
             self.grabGesture(Qt.PinchGesture)
@@ -41,34 +106,6 @@ class ModernGLWidget(QOpenGLWidget):
             self.ctx = None
             return
 
-        vert_shader = '''
-        #version 330
-        in vec2 in_vert;
-        out vec2 uv;
-        void main() {
-            uv = in_vert * 0.5 + 0.5;
-            gl_Position = vec4(in_vert, 0.0, 1.0);
-        }
-        '''
-
-        # Load fragment shader from file
-
-        shader_path = os.path.join(os.path.dirname(__file__), 'shaders', 'raymarch_julia.frag')
-        with open(shader_path, 'r') as f:
-            frag_shader = f.read()
-
-        self.prog = self.ctx.program(
-            vertex_shader=vert_shader,
-            fragment_shader=frag_shader
-        )
-
-        print(self.ctx.error)
-        # Check for errors
-        # if not glGetShaderiv(shader, GL_COMPILE_STATUS):
-        #     info_log = glGetShaderInfoLog(shader).decode()
-        #     print("Shader Compilation Error:\n", info_log) # Prints error
-        #     raise Exception()
-
         vertices = np.array([
             -1.0, -1.0,
              1.0, -1.0,
@@ -76,26 +113,190 @@ class ModernGLWidget(QOpenGLWidget):
              1.0,  1.0,
         ], dtype='f4')
         self.vbo = self.ctx.buffer(vertices)
-        self.vao = self.ctx.simple_vertex_array(self.prog, self.vbo, 'in_vert')
+
+        # Programs belong to the old context, if there was one
+        self._programs = {}
+        self._program_power = None
+        self._select_program(self.controls.get('power'))
+        print(self.ctx.error)
+
+        self.blit_prog = self.ctx.program(vertex_shader=VERTEX_SHADER, fragment_shader=BLIT_SHADER)
+        self.blit_vao = self.ctx.simple_vertex_array(self.blit_prog, self.vbo, 'in_vert')
+        # A frame's timing is read back during the next frame, by which time
+        # the GPU has finished it, so reading it never stalls the pipeline
+        self._queries = [self.ctx.query(time=True) for _ in range(2)]
+        self._pending_timing = None
 
         self.ctx.viewport = (0, 0, self.width(), self.height())
 
-    def paintGL(self):
-        self.ctx.clear(0.0,1.0,0.0)
+    def _select_program(self, power):
+        # One program per polynomial power, with juliaSDF unrolled for it,
+        # compiled the first time that power is shown and cached after.
+        if power not in self._programs:
+            prog = self.ctx.program(
+                vertex_shader=VERTEX_SHADER,
+                fragment_shader=fragment_shader(power)
+            )
+            self._programs[power] = (prog, self.ctx.simple_vertex_array(prog, self.vbo, 'in_vert'))
+        self.prog, self.vao = self._programs[power]
+        self._program_power = power
 
-        for key in self.controls:
+        # Uniform values are per-program, so the newly bound one needs them all
+        self._dirty_uniforms = set(self.controls)
+        self._uploaded_view = None
+
+    def _upload_uniforms(self):
+        if self.controls.get('power') != self._program_power:
+            self._select_program(self.controls.get('power'))
+
+        for key in self._dirty_uniforms:
             if key in self.prog:
-                self.prog[key].value = self.controls[key]
+                uniform = self.prog[key]
+                value = self.controls[key]
+                if isinstance(value, list) and uniform.array_length < len(value):
+                    # Unrolled variants only read coefficients[0..power], and the
+                    # compiler shrinks the array to match
+                    value = value[:uniform.array_length]
+                uniform.value = value
+        self._dirty_uniforms.clear()
 
-        self.prog['camera'].value = tuple([
+        camera = tuple([
             self.camera['theta'],
             self.camera['phi'],
             self.camera['distance']
         ])
+        aspect = max(self.width(), 1) / max(self.height(), 1)
+        if (camera, aspect) != self._uploaded_view:
+            self.prog['camera'].value = camera
+            self.prog['aspect'].value = aspect
+            self._uploaded_view = (camera, aspect)
+
+    def _target(self, scale):
+        # Offscreen colour target at 1/scale of the widget size, recreated on resize.
+        w = max(self.width() // scale, 1)
+        h = max(self.height() // scale, 1)
+        texture, fbo = self._targets.get(scale, (None, None))
+        if texture is None or texture.size != (w, h):
+            if fbo is not None:
+                fbo.release()
+                texture.release()
+            texture = self.ctx.texture((w, h), 3)
+            texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+            fbo = self.ctx.framebuffer(color_attachments=[texture])
+            fbo.clear(0.0, 0.0, 0.0)
+            self._targets[scale] = (texture, fbo)
+        return texture, fbo
+
+    def restartProgressive(self):
+        # Drop back to the cheap pass; called on any camera/control change.
+        self._pass_index = 0
+        self._band_index = 0
+        self._elapsed_ms = 0.0
+        # Whatever was timed last frame belongs to the superseded image
+        self._pending_timing = None
+        self._refine_timer.stop()
+        self._settle_timer.start(REFINE_DELAY_MS)
+        self.update()
 
-        self.prog['aspect'].value = self.ctx.viewport[2]/self.ctx.viewport[3]
+    def _set_quality(self, enable_ao, enable_reflection, max_steps):
+        for key, value in (('enableAO', enable_ao), ('enableReflection', enable_reflection),
+                           ('maxSteps', max_steps)):
+            if key in self.prog:
+                self.prog[key].value = value
 
+    def _render_pass(self, fbo, enable_ao, enable_reflection, max_steps, band, bands):
+        self._set_quality(enable_ao, enable_reflection, max_steps)
+        fbo.use()
+        w, h = fbo.size
+        y0 = h * band // bands
+        y1 = h * (band + 1) // bands
+        self.ctx.viewport = (0, 0, w, h)
+        self.ctx.scissor = (0, y0, w, y1 - y0) if bands > 1 else None
         self.vao.render(mode = moderngl.TRIANGLE_STRIP)
+        self.ctx.scissor = None
+
+    def _blit(self, texture, fbo, size):
+        fbo.use()
+        self.ctx.viewport = (0, 0, *size)
+        texture.use(location=0)
+        self.blit_prog['image'].value = 0
+        self.blit_vao.render(mode = moderngl.TRIANGLE_STRIP)
+
+    def _blit_to_screen(self, texture):
+        screen = self.ctx.detect_framebuffer(self.defaultFramebufferObject())
+        self._blit(texture, screen, (self.width(), self.height()))
+
+    def _next_query(self):
+        query = self._queries[self._query_index]
+        self._query_index = 1 - self._query_index
+        return query
+
+    def _report_timing(self, timing):
+        if timing is None:
+            return
+        query, name, progressive = timing
+        pass_ms = query.elapsed / 1e6
+        if progressive:
+            self._elapsed_ms += pass_ms
+            self.frameTimed.emit(name, pass_ms, self._elapsed_ms)
+        else:
+            self.frameTimed.emit(name, pass_ms, pass_ms)
+
+    def _paint_progressive(self):
+        if self._pass_index >= len(PROGRESSIVE_PASSES):
+            # Fully refined already (e.g. a repaint from the window system):
+            # just show the persistent image again.
+            self._blit_to_screen(self._target(1)[0])
+            return
+        if self._pass_index > 0 and self._settle_timer.isActive():
+            # Still interacting: keep showing the cheap pass until input settles.
+            self._blit_to_screen(self._target(PROGRESSIVE_PASSES[0][1])[0])
+            return
+
+        name, scale, enable_ao, enable_reflection, max_steps, bands = PROGRESSIVE_PASSES[self._pass_index]
+        texture, fbo = self._target(scale)
+        if self._pass_index > 0 and self._band_index == 0:
+            previous_scale = PROGRESSIVE_PASSES[self._pass_index - 1][1]
+            if previous_scale != scale:
+                self._blit(self._target(previous_scale)[0], fbo, fbo.size)
+
+        query = self._next_query()
+        with query:
+            self._render_pass(fbo, enable_ao, enable_reflection, max_steps, self._band_index, bands)
+        self._pending_timing = (query, name, True)
+
+        # Low-res passes are shown stretched; full-res passes accumulate into the
+        # persistent target, so each band appears on top of the image before it.
+        self._blit_to_screen(texture)
+
+        # Advance to the next band/pass and schedule it for the next idle frame
+        # (the settle timer schedules the first refinement itself). After the
+        # last pass, one more idle frame reads back its timing.
+        self._band_index += 1
+        if self._band_index >= bands:
+            self._band_index = 0
+            self._pass_index += 1
+        if not self._settle_timer.isActive():
+            self._refine_timer.start(0)
+
+    def paintGL(self):
+        self.ctx.clear(0.0,1.0,0.0)
+
+        self._upload_uniforms()
+
+        previous, self._pending_timing = self._pending_timing, None
+        if self.progressive and self.blit_prog is not None:
+            self._paint_progressive()
+        else:
+            # Progressive passes leave their own quality settings behind
+            _name, _scale, enable_ao, enable_reflection, max_steps, _bands = PROGRESSIVE_PASSES[-1]
+            self._set_quality(enable_ao, enable_reflection, max_steps)
+            query = self._next_query()
+            with query:
+                self.vao.render(mode = moderngl.TRIANGLE_STRIP)
+            self._pending_timing = (query, "full", False)
+        self._report_timing(previous)
+
         if self.ctx.error != "GL_NO_ERROR":
             print(f"OpenGL Error: {self.ctx.error}")
 
@@ -107,7 +308,7 @@ class ModernGLWidget(QOpenGLWidget):
         self.camera['phi'] += dy * 0.01
         self.camera['phi'] = np.clip(self.camera['phi'], 1e-6, np.pi-1e-6)
         self.cameraMoved.emit(self.camera['theta'], self.camera['phi'])
-        self.update()
+        self.restartProgressive()
 
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
@@ -125,7 +326,7 @@ class ModernGLWidget(QOpenGLWidget):
             if new_dist != self.camera['distance']:
                 self.camera['distance'] = new_dist
                 self.zoomChanged.emit(self.camera['distance'])
-                self.update()
+                self.restartProgressive()
         except Exception:
             import traceback as _tb
             _tb.print_exc()
@@ -157,7 +358,7 @@ class ModernGLWidget(QOpenGLWidget):
                     if new_dist != self.camera['distance']:
                         self.camera['distance'] = new_dist
                         self.zoomChanged.emit(self.camera['distance'])
-                        self.update()
+                        self.restartProgressive()
                         #print(f"New distance: {new_dist:.3f}")
                     return True
         except Exception:
@@ -166,11 +367,17 @@ class ModernGLWidget(QOpenGLWidget):
         return False
 
     def updateControls(self, controls):
+        # UpdateScheduler already coalesces per frame and passes only the
+        # keys that changed, so everything here is marked for upload.
+        if not controls:
+            return
         self.controls.update(controls)
+        self._dirty_uniforms.update(controls)
         self.controlsChanged.emit(self.controls)
-        self.update()
+        self.restartProgressive()
 
     def resizeGL(self, w, h):
         if self.ctx:
             self.ctx.viewport = (0, 0, w, h)
             self.ctx.detect_framebuffer().use()
+            self.restartProgressive()
@@ -0,0 +1,77 @@
+# Per-power variants of raymarch_julia.frag with the Julia polynomial unrolled
+import functools
+import os
+
+SHADER_PATH = os.path.join(os.path.dirname(__file__), 'shaders', 'raymarch_julia.frag')
+MAX_POWER = 8   # coefficients[9] in the shader
+
+_BEGIN = "// BEGIN juliaSDF"
+_END = "// END juliaSDF"
+
+
+def julia_sdf_glsl(power):
+    """GLSL juliaSDF specialized for `power`: the Horner evaluation of the
+    polynomial and its derivative is unrolled, so the inner loop, its bounds
+    checks and the dynamic coefficient indexing all disappear."""
+    if not 0 <= power <= MAX_POWER:
+        raise ValueError(f"power must be between 0 and {MAX_POWER}, got {power}")
+
+    if power == 0:
+        update = [
+            "        vec4 b = coefficients[0];",
+            "        vec4 d = vec4(0,0,0,0);",
+        ]
+    else:
+        update = [
+            f"        vec4 b = coefficients[{power}];",
+            f"        vec4 d = {float(power)} * coefficients[{power}];",
+        ]
+        for n in range(power - 1, 0, -1):
+            update.append(f"        b = qmul(z, b) + coefficients[{n}];")
+            update.append(f"        d = qmul(z, d) + {float(n)} * coefficients[{n}];")
+        update.append("        b = qmul(z, b) + coefficients[0];")
+
+    lines = [
+        _BEGIN,
+        f"// Generated for power = {power} by shader_variants.py",
+        "float juliaSDF(vec3 p) {",
+        "    vec4 z = vec4(p, slice);",
+        "    vec4 zp = vec4(1,0,0,0);",
+        "    float z2 = dot(z, z);",
+        "    bool escaped = false;",
+        "",
+        "    for (int i = 0; i < iterations; i++) {",
+        *update,
+        "",
+        "        zp = qmul(d, zp);",
+        "        z = b;",
+        "        z2 = dot(z, z);",
+        "        if (z2 > bailout) {",
+        "            escaped = true;",
+        "            break;",
+        "        }",
+        "    }",
+        "",
+        "    float dist = 0.0;",
+        "    if (escaped) {",
+        "        float zp2 = max(dot(zp, zp), 1e-6);",
+        f"        dist = sqrt(z2/zp2) * log(z2) / {2.0 * max(power, 1)};",
+        "    }",
+        "    return dist - offset;",
+        "}",
+        _END,
+    ]
+    return "\n".join(lines)
+
+
+@functools.lru_cache(maxsize=None)
+def fragment_shader(power=None):
+    """raymarch_julia.frag with juliaSDF specialized for `power` (None keeps
+    the generic runtime-loop version)."""
+    with open(SHADER_PATH, 'r') as f:
+        source = f.read()
+    if power is None:
+        return source
+    start = source.index(_BEGIN)
+    end = source.index(_END) + len(_END)
+    return source[:start] + julia_sdf_glsl(int(power)) + source[end:]
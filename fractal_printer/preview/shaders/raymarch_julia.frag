@@ -6,12 +6,18 @@ uniform vec4 coefficients[9];
 uniform float slice;
 uniform int power;
 uniform int iterations;
-uniform int bailout;
+uniform float bailout;
 uniform float offset;
 
 uniform vec3 camera; // theta, phi, distance
 uniform float aspect; // ratio of width to hight
 
+// Progressive rendering controls (see ModernGLWidget): cheap passes during
+// interaction turn these down, idle refinement passes turn them back up.
+uniform int maxSteps = 5000;
+uniform bool enableAO = true;
+uniform bool enableReflection = true;
+
 
 vec4 qmul(vec4 a, vec4 b) {
     return vec4(
@@ -20,14 +26,6 @@ vec4 qmul(vec4 a, vec4 b) {
         a.x*b.z + a.z*b.x + a.w*b.y - a.y*b.w,
         a.x*b.w + a.w*b.x + a.y*b.z - a.z*b.y);
 }
-vec4 qpow(vec4 a, int n) {
-    vec4 b = vec4(a);
-    
-    for (int i = 1; i < n; i++){
-        b = qmul(b, a);
-    }
-    return b;
-}
 vec4 qpow2(vec4 a, int n) {
     float mag = length(a);
     float magn = pow(mag, float(n));
@@ -49,50 +47,53 @@ vec4 qpow2(vec4 a, int n) {
     return vec4(magn * cos(nTheta), magn * sin(nTheta) * nHat);
 }
 // SDF for a quaternionic julia set
-
-float juliaSDF(vec3 p, vec4 c[9], float slice, int power, int iterations, int bailout, float offset) {
+// BEGIN juliaSDF
+// Generic version for any power. ModernGLWidget swaps this block for one
+// unrolled for the current power (see shader_variants.py); keep the two in sync.
+float juliaSDF(vec3 p) {
     vec4 z = vec4(p, slice);
     vec4 zp = vec4(1,0,0,0);
-    vec4 z_ = vec4(0,0,0,0);
-    vec4 zp_ = vec4(0,0,0,0);
-
     float z2 = dot(z, z);
-    float zp2 = 0;
+    bool escaped = false;
 
     for (int i = 0; i < iterations; i++) {
-        z_ = vec4(0,0,0,0);
-        zp_ = vec4(0,0,0,0);
-        for (int n = 0; n <= power; n++) {
-            if (n==0){
-                z_ = z_ + c[n];
-            } else if (n == 1){
-                z_ = z_ + qmul(z, c[n]);
-                zp_ = zp_ + c[n];
-            } else {
-                z_ = z_ + qmul(qpow(z, n), c[n]);
-                zp_ = zp_ + qmul(qpow(z, n-1), c[n]) * float(n);
-            }
+        // Horner scheme (same sums as the numba kernel's running power):
+        //   f(z)  = c0 + z(c1 + z(c2 + ...))
+        //   f'(z) = c1 + z(2c2 + z(3c3 + ...))
+        vec4 b = coefficients[power];
+        vec4 d = float(power) * coefficients[power];
+        for (int n = power - 1; n >= 1; n--) {
+            b = qmul(z, b) + coefficients[n];
+            d = qmul(z, d) + float(n) * coefficients[n];
+        }
+        if (power >= 1) {
+            b = qmul(z, b) + coefficients[0];
+        } else {
+            d = vec4(0,0,0,0);
         }
 
-        z = z_;
-        zp = qmul(zp_, zp);
-
-        z2 = dot(z,z);
-
-        //if (zp2 > 1e20) break;
-        if (z2 > float(100000)) {
+        zp = qmul(d, zp);
+        z = b;
+        z2 = dot(z, z);
+        if (z2 > bailout) {
+            escaped = true;
             break;
         }
     }
 
-    zp2 = dot(zp, zp);
-    float dist = sqrt(z2/zp2) * log(z2) / (float(power) * 2.0) ;
+    // Bounded points sit inside the set: no distance estimate, just "here"
+    float dist = 0.0;
+    if (escaped) {
+        float zp2 = max(dot(zp, zp), 1e-6);
+        dist = sqrt(z2/zp2) * log(z2) / (float(max(power, 1)) * 2.0);
+    }
     return dist - offset;
 }
+// END juliaSDF
 
 // Scene SDF
 float sceneSDF(vec3 p) {
-    float d = juliaSDF(p, coefficients, slice, power, iterations, bailout, offset);
+    float d = juliaSDF(p);
     // step carefully near the origin
     return d;
 }
@@ -123,7 +124,7 @@ vec3 getRayDir(vec2 uv, vec3 camPos) {
 float raymarch(vec3 ro, vec3 rd, out vec3 pHit, float maxDist) {
     float t = 0.0;
     float d = 1.0;
-    for (int i = 0; i < 5000; ++i) {
+    for (int i = 0; i < maxSteps; ++i) {
         if (d < 0.001) return t;
         if (t > maxDist) break;
         pHit = ro + rd * t;
@@ -212,18 +213,21 @@ void main() {
         fragColor = vec4(1.0, uv.y*0.1, 0.15, 1.0);
     } else if (t>0.0) {
         vec3 n = estimateNormal(pHit);
-        float ao = ambientOcclusion(pHit, n);
+        float ao = enableAO ? ambientOcclusion(pHit, n) : 1.0;
 
         vec3 local = shadeSurface(pHit, n, camPos);
 
-        vec3 reflDir = reflect(rayDir, n);
-        vec3 reflColor = traceReflection(pHit, reflDir, camPos);
+        vec3 color = local * ao;
+        if (enableReflection) {
+            vec3 reflDir = reflect(rayDir, n);
+            vec3 reflColor = traceReflection(pHit, reflDir, camPos);
 
-        vec3 viewDir = normalize(camPos - pHit);
-        float fresnel = pow(1.0 - max(dot(n, viewDir), 0.0), 5.0);
-        float reflectivity = mix(0.15, 0.4, fresnel);
+            vec3 viewDir = normalize(camPos - pHit);
+            float fresnel = pow(1.0 - max(dot(n, viewDir), 0.0), 5.0);
+            float reflectivity = mix(0.15, 0.4, fresnel);
 
-        vec3 color = mix(local * ao, reflColor, reflectivity);
+            color = mix(color, reflColor, reflectivity);
+        }
         fragColor = vec4(color,1.0);
     } else {
         fragColor = vec4(uv.x*0.1, uv.y*0.1, 0.15, 1.0);
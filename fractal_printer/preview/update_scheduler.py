@@ -0,0 +1,81 @@
+# UpdateScheduler: coalesces control changes between ControlsPanel and consumers
+import time
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+# Deliver at most one batch of changes per display frame (~60 Hz)
+FRAME_INTERVAL_MS = 16
+
+
+class _ThrottledSubscriber(QObject):
+    # Calls `callback` with the latest settings at most once every `interval_ms`,
+    # always delivering the final state once changes stop (trailing edge).
+    def __init__(self, callback, interval_ms, parent=None):
+        super().__init__(parent)
+        self.callback = callback
+        self.interval_ms = interval_ms
+        self.settings = None
+        self.last_delivery = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.deliver)
+
+    def notify(self, settings):
+        self.settings = settings
+        if self.timer.isActive():
+            return
+        if self.last_delivery is None:
+            wait = 0
+        else:
+            since = (time.monotonic() - self.last_delivery) * 1000
+            wait = max(0, int(self.interval_ms - since))
+        self.timer.start(wait)
+
+    def deliver(self):
+        self.last_delivery = time.monotonic()
+        self.callback(self.settings)
+
+
+class UpdateScheduler(QObject):
+    # Only the keys whose values actually changed since the last delivery
+    changesReady = pyqtSignal(dict)
+
+    def __init__(self, parent=None, interval_ms=FRAME_INTERVAL_MS):
+        super().__init__(parent)
+        self.settings = {}      # latest full settings
+        self._delivered = {}    # settings as of the last changesReady
+        self._subscribers = []
+        self._frame_timer = QTimer(self)
+        self._frame_timer.setSingleShot(True)
+        self._frame_timer.setInterval(interval_ms)
+        self._frame_timer.timeout.connect(self.flush)
+
+    def submit(self, settings):
+        # Merge and wait for the frame tick; any further submits before then
+        # are folded into the same delivery.
+        self.settings.update(settings)
+        if not self._frame_timer.isActive():
+            self._frame_timer.start()
+
+    def flush(self):
+        self._frame_timer.stop()
+        changed = {k: v for k, v in self.settings.items() if self._delivered.get(k) != v}
+        if not changed:
+            return
+        self._delivered.update(changed)
+        self.changesReady.emit(changed)
+        for subscriber in self._subscribers:
+            subscriber.notify(dict(self.settings))
+
+    def subscribe(self, callback, interval_ms):
+        """Call `callback(settings)` with the full settings dict whenever they
+        change, but no more often than every `interval_ms` (for expensive
+        consumers such as a mesh preview)."""
+        subscriber = _ThrottledSubscriber(callback, interval_ms, parent=self)
+        self._subscribers.append(subscriber)
+        if self._delivered:
+            subscriber.notify(dict(self.settings))
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.timer.stop()
+        self._subscribers.remove(subscriber)
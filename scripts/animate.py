@@ -0,0 +1,47 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from fractal_printer.paths import OUTPUT_DIR
+from fractal_printer.mesh import animation
+from fractal_printer.preview import cpu_renderer
+
+
+def _parse_key(key):
+    # "slice" or a dotted path such as "coefficients.1.2"
+    parts = key.split(".")
+    return tuple(int(p) if p.isdigit() else p for p in parts) if len(parts) > 1 else key
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                    prog='Animate',
+                    description='Sweeps one setting over a range and writes a numbered mesh or frame sequence')
+
+    parser.add_argument('settings', help='settings JSON file, as copied from the preview app')
+    parser.add_argument("-k", "--key", default="slice", help='setting to sweep, e.g. slice or coefficients.1.2')
+    parser.add_argument("--start", type=float, required=True)
+    parser.add_argument("--stop", type=float, required=True)
+    parser.add_argument("-n", "--frames", type=int, default=60)
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR / "animation")
+    parser.add_argument("--mesh", type=int, metavar="SAMPLES", help='write meshes with this many samples per frame')
+    parser.add_argument("--width", type=int, default=256)
+    parser.add_argument("--height", type=int, default=256)
+    parser.add_argument("--turntable", type=float, default=0.0, help='camera orbit over the sequence, in degrees')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    settings = cpu_renderer.load_settings(args.settings)
+    sequence = animation.sweep(settings, _parse_key(args.key), args.start, args.stop, args.frames)
+    if args.mesh:
+        animation.mesh_sequence(sequence, args.output, samples=args.mesh)
+    else:
+        animation.render_sequence(sequence, args.output, width=args.width, height=args.height,
+                                  turntable=np.radians(args.turntable))
+    print(f"Wrote {args.frames} frames in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,55 @@
+import argparse
+import sys
+import time
+
+from fractal_printer.paths import OUTPUT_DIR
+from fractal_printer.mesh import parameter_explorer
+from fractal_printer.preview import cpu_renderer
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                    prog='Explore Settings',
+                    description='Scores thousands of random Julia settings at low resolution and keeps the best')
+
+    parser.add_argument("-n", "--candidates", type=int, default=2000)
+    parser.add_argument("-k", "--shortlist", type=int, default=20)
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR / "explore")
+    parser.add_argument("--order", type=int, default=3, help='highest random coefficient')
+    parser.add_argument("--base", help='settings JSON to take slice/offset/iterations/bailout from')
+    parser.add_argument("--resolution", type=int, default=32, help='scoring grid points per axis')
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--previews", action="store_true", help='also render CPU previews of the shortlist')
+    parser.add_argument("--mesh", type=int, metavar="SAMPLES",
+                        help='also queue the shortlist for meshing with this many samples')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    base = cpu_renderer.load_settings(args.base) if args.base else None
+    shortlist = parameter_explorer.explore(args.candidates, shortlist=args.shortlist, order=args.order,
+                                           base=base, resolution=args.resolution, seed=args.seed)
+    paths = parameter_explorer.save_shortlist(shortlist, args.output)
+    for path, candidate in zip(paths, shortlist):
+        print(f"{path.name}: score {candidate.score:.3f}, fill {candidate.fill_fraction:.1%}, "
+              f"connected {candidate.connected_fraction:.0%}, thin {candidate.thin_fraction:.0%}")
+    print(f"Explored {args.candidates} settings in {time.perf_counter() - start:.1f}s")
+
+    if args.previews:
+        cpu_renderer.render_batch(paths, args.output)
+
+    if args.mesh:
+        from fractal_printer.mesh.generation_jobs import GenerationQueue
+        queue = GenerationQueue()
+        try:
+            parameter_explorer.queue_shortlist(shortlist, queue, args.output, samples=args.mesh)
+            while queue.active():
+                for job in queue.poll():
+                    print(f"#{job.job_id} {job.status} {job.stage}")
+                time.sleep(1)
+            queue.poll()
+        finally:
+            queue.shutdown()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import json
+import sys
+
+from fractal_printer.mesh import generation_service as gs
+from fractal_printer.preview import cpu_renderer
+
+
+def _print_job(job):
+    fraction = f" {job['fraction']:.0%}" if job["fraction"] is not None else ""
+    stage = f" {job['stage']}{fraction}" if job["stage"] else ""
+    print(f"#{job['id']} {job['status']}{stage} (priority {job['priority']}, "
+          f"{job['cores']} cores, {job['memory_gb']:g} GB)")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                    prog='Generation Service',
+                    description='Runs or talks to the local mesh generation service')
+    parser.add_argument("--url", default=f"http://127.0.0.1:{gs.DEFAULT_PORT}",
+                        help='service address, http://host:port or unix:///path')
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help='run the service')
+    serve.add_argument("--port", type=int, default=gs.DEFAULT_PORT)
+    serve.add_argument("--socket", help='listen on this unix socket instead of a port')
+    serve.add_argument("--root", default=gs.DEFAULT_ROOT, help='job database and results directory')
+    serve.add_argument("--cores", type=int, help='cores to hand out (default: all)')
+    serve.add_argument("--memory", type=float, help='GB to hand out (default: physical memory)')
+
+    submit = commands.add_parser("submit", help='queue a settings JSON file')
+    submit.add_argument("settings", help='settings JSON file, as copied from the preview app')
+    submit.add_argument("-s", "--samples", type=int, default=2**24)
+    submit.add_argument("-p", "--priority", type=int, default=0)
+    submit.add_argument("--cores", type=int, default=1)
+    submit.add_argument("--memory", type=float, default=1.0, help='GB to reserve')
+    submit.add_argument("--options", default="{}", help='further generate_mesh options as JSON')
+    submit.add_argument("-w", "--watch", action="store_true", help='follow progress until it finishes')
+
+    commands.add_parser("list", help='show all jobs')
+    for name, text in (("watch", 'follow a job until it finishes'), ("cancel", 'cancel a job')):
+        command = commands.add_parser(name, help=text)
+        command.add_argument("job", type=int)
+    download = commands.add_parser("download", help='fetch a finished mesh')
+    download.add_argument("job", type=int)
+    download.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        service = gs.GenerationService(args.root, cores=args.cores, memory_gb=args.memory)
+        print(f"Serving with {service.cores} cores and {service.memory_gb:.1f} GB")
+        try:
+            asyncio.run(service.serve(port=args.port, unix_socket=args.socket,
+                                      ready=lambda address: print(f"Listening on {address}")))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    client = gs.ServiceClient(args.url)
+    if args.command == "submit":
+        options = {"samples": args.samples, **json.loads(args.options)}
+        job = client.submit(cpu_renderer.load_settings(args.settings), priority=args.priority,
+                            cores=args.cores, memory_gb=args.memory, **options)
+        if job["deduplicated"]:
+            print("Same settings already queued or done:")
+        _print_job(job)
+        if args.watch:
+            for job in client.events(job["id"]):
+                _print_job(job)
+    elif args.command == "list":
+        for job in client.jobs():
+            _print_job(job)
+    elif args.command == "watch":
+        for job in client.events(args.job):
+            _print_job(job)
+    elif args.command == "cancel":
+        _print_job(client.cancel(args.job))
+    elif args.command == "download":
+        print(client.download(args.job, args.path))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,40 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from fractal_printer.paths import OUTPUT_DIR
+from fractal_printer.preview import cpu_renderer
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+                    prog='Render Previews',
+                    description='Renders PNG previews of Julia settings files on the CPU (no GPU needed)')
+
+    parser.add_argument('settings', nargs='+', help='settings JSON files, as copied from the preview app')
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR / "previews")
+    parser.add_argument("--width", type=int, default=256)
+    parser.add_argument("--height", type=int, default=256)
+    parser.add_argument("--levels", type=int, default=1,
+                        help='also write 1/2, 1/4, ... resolution passes first')
+    parser.add_argument("--theta", type=float, default=cpu_renderer.DEFAULT_CAMERA['theta'])
+    parser.add_argument("--phi", type=float, default=cpu_renderer.DEFAULT_CAMERA['phi'])
+    parser.add_argument("--distance", type=float, default=cpu_renderer.DEFAULT_CAMERA['distance'])
+    parser.add_argument("--no_ao", action="store_true")
+    parser.add_argument("--no_reflections", action="store_true")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    written = cpu_renderer.render_batch(
+        args.settings, args.output,
+        width=args.width, height=args.height, levels=args.levels,
+        camera={'theta': args.theta, 'phi': np.clip(args.phi, 1e-6, np.pi-1e-6), 'distance': args.distance},
+        ambient_occlusion=not args.no_ao, reflections=not args.no_reflections,
+    )
+    print(f"Wrote {len(written)} images in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])